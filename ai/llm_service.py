@@ -1,55 +1,61 @@
+import asyncio
+import hashlib
 import logging
-from typing import Dict, List, Optional
+import re
+import shelve
+import threading
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+import httpx
+import orjson
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError
+from aiolimiter import AsyncLimiter
+from cachetools import LRUCache, TTLCache
 from langchain_openai import ChatOpenAI
+from openai import AsyncOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema import HumanMessage, SystemMessage
 from config import config
+from database.connection import on_schema_refresh
 
 logger = logging.getLogger(__name__)
 
-class LLMService:
-    def __init__(self):
-        self.llm = None
-        self.initialize_llm()
-    
-    def initialize_llm(self):
-        """Initialize the LLM with OpenAI"""
-        try:
-            if not config.OPENAI_API_KEY:
-                raise ValueError("OpenAI API key not found in environment variables")
-            
-            self.llm = ChatOpenAI(
-                model="gpt-4",
-                temperature=0.1,
-                api_key=config.OPENAI_API_KEY
-            )
-            logger.info("LLM service initialized successfully")
-            
-        except Exception as e:
-            logger.error(f"Failed to initialize LLM service: {e}")
-            raise
-    
-    def get_database_schema_prompt(self, table_info: Dict) -> str:
-        """Generate a comprehensive database schema description for the LLM"""
-        schema_prompt = """
+# Pooled HTTP clients shared by every ChatOpenAI instance so that TCP/TLS
+# connections to the OpenAI API are kept alive and reused between calls
+_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+_HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+http_client = httpx.Client(limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT, http2=True)
+http_async_client = httpx.AsyncClient(limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT, http2=True)
+
+async def close_http_clients():
+    """Close the shared HTTP clients, called on application shutdown"""
+    http_client.close()
+    await http_async_client.aclose()
+
+# SQL generation tries the fast model first and escalates to the strong one
+FAST_MODEL = "gpt-4o-mini"
+STRONG_MODEL = "gpt-4"
+
+# Fallback suggestions used when the LLM is unavailable
+DEFAULT_SUGGESTIONS = (
+    "Which stocks have a price above the moving average 50?",
+    "Which stocks had the highest volume increase today?",
+    "Show me stocks with positive price changes in the last week",
+    "Which stocks have upcoming earnings announcements?",
+    "Find stocks with consistent price increases over the last month"
+)
+
+# Static instructions shared by every SQL generation call. They are kept
+# byte-identical and placed before anything dynamic so that OpenAI's prompt
+# caching can reuse the prefix across requests.
+STATIC_RULES_PREFIX = """
 You are an AI assistant that helps users query a stock market database. 
-The database contains the following tables and their structure:
+The structure of the database tables is listed after these instructions.
 
-"""
-        
-        for table_name, columns in table_info.items():
-            schema_prompt += f"\nTable: {table_name}\n"
-            schema_prompt += "Columns:\n"
-            for col in columns:
-                schema_prompt += f"  - {col['field']} ({col['type']})"
-                if col['null'] == 'NO':
-                    schema_prompt += " [NOT NULL]"
-                if col['key'] == 'PRI':
-                    schema_prompt += " [PRIMARY KEY]"
-                schema_prompt += "\n"
-        
-        schema_prompt += """
-IMPORTANT: All the fields listed above are available in the database. Do NOT say fields don't exist.
+IMPORTANT: All the fields listed in the database structure are available in the database. Do NOT say fields don't exist.
 
 Field interpretations for stock data:
 - Nrnum: Stock identifier (like a symbol/ticker)
@@ -86,22 +92,9 @@ SQL Generation Rules:
 
 CRITICAL: Generate ONLY valid, executable SQL. If you cannot create a valid query, return: SELECT 1 LIMIT 0;
 """
-        
-        return schema_prompt
-    
-    def generate_sql_query(self, user_question: str, table_info: Dict) -> Dict:
-        """Generate SQL query from natural language question"""
-        try:
-            if not self.llm:
-                raise ValueError("LLM not initialized")
-            
-            # Create the system prompt with database schema
-            system_prompt = self.get_database_schema_prompt(table_info)
-            
-            # Create the user prompt with stronger instructions
-            user_prompt = f"""
-User Question: {user_question}
 
+# Per-request instructions for SQL generation; the user question is appended last
+SQL_REQUEST_INSTRUCTIONS = """
 CRITICAL: Generate ONLY a valid MySQL SQL query that can be executed immediately.
 
 Requirements:
@@ -119,40 +112,322 @@ SELECT column1, column2 FROM table_name WHERE condition LIMIT 100;
 
 IMPORTANT: Never use placeholder text like [Enter value here] - use actual SQL syntax.
 """
+
+# Static instructions shared by every explanation call, sent ahead of the
+# per-query data so the provider can reuse the cached prompt prefix
+EXPLANATION_SYSTEM_PROMPT = """You are a helpful financial data analyst. Explain stock market data in clear, understandable terms.
+
+Please provide a natural language explanation of the query results you are given. 
+Make it conversational and easy to understand for a non-technical user.
+Include insights about what the data shows and any notable patterns.
+"""
+
+def _schema_key(table_info: Dict) -> bytes:
+    """Canonical representation of table_info used as the schema cache key"""
+    return orjson.dumps(table_info, option=orjson.OPT_SORT_KEYS, default=str)
+
+# Stock numbers (6+ digits) are templated out of cached questions and SQL
+_STOCK_NUMBER_RE = re.compile(r'\b\d{6,}\b')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Post-processing of raw LLM output in _clean_sql_response
+_FENCE_RE = re.compile(r"^```(?:sql)?\s*|\s*```$", re.IGNORECASE | re.MULTILINE)
+_PLACEHOLDER_RE = re.compile(r"\[(?:Enter[^\]]*|specific[^\]]*|value[^\]]*)\]")
+_REFUSAL_RE = re.compile(r"I'm sorry|I cannot|does not contain", re.IGNORECASE)
+
+def _normalize_question(question: str) -> Tuple[str, List[str]]:
+    """Normalize a question for cache lookup and return the stock numbers it mentions"""
+    normalized = _WHITESPACE_RE.sub(' ', question.lower().strip())
+    return _STOCK_NUMBER_RE.sub('<NRNUM>', normalized), _STOCK_NUMBER_RE.findall(normalized)
+
+def _is_usable_sql(sql_query: str) -> bool:
+    """Check that cleaned LLM output is a single read-only query that parses as MySQL"""
+    if sql_query.startswith("SELECT 1 LIMIT 0"):
+        return False
+    try:
+        statements = sqlglot.parse(sql_query, dialect="mysql")
+    except ParseError:
+        return False
+    # A SELECT, or a UNION of them; never writes or several statements
+    return len(statements) == 1 and isinstance(statements[0], (exp.Select, exp.Union))
+
+@lru_cache(maxsize=8)
+def _render_schema(schema_key: bytes) -> str:
+    """Render the table structure block of the prompt in a stable table order"""
+    table_info = orjson.loads(schema_key)
+    
+    parts = ["\nThe database contains the following tables and their structure:\n"]
+    
+    for table_name, columns in sorted(table_info.items()):
+        column_lines = "".join(
+            f"  - {col['field']} ({col['type']})"
+            f"{' [NOT NULL]' if col['null'] == 'NO' else ''}"
+            f"{' [PRIMARY KEY]' if col.get('key') == 'PRI' else ''}\n"
+            for col in columns
+        )
+        parts.append(f"\nTable: {table_name}\nColumns:\n{column_lines}")
+    
+    return "".join(parts)
+
+@lru_cache(maxsize=8)
+def _render_schema_prompt(schema_key: bytes) -> str:
+    """Full schema prompt: static rules followed by the table structure"""
+    return STATIC_RULES_PREFIX + _render_schema(schema_key)
+
+def invalidate_schema_prompt_cache():
+    """Drop all rendered schema prompts, called when the database schema is refreshed"""
+    _render_schema.cache_clear()
+    _render_schema_prompt.cache_clear()
+
+on_schema_refresh(invalidate_schema_prompt_cache)
+
+# Identifies the prompts and models that produced a cached SQL query, so a
+# persisted cache entry is only reused while they stay the same
+_SQL_PROMPT_VERSION = hashlib.blake2b(
+    f"{FAST_MODEL}|{STRONG_MODEL}|{STATIC_RULES_PREFIX}|{SQL_REQUEST_INSTRUCTIONS}".encode(), digest_size=8
+).hexdigest()
+
+def _sql_disk_key(template: str, schema_key: bytes) -> str:
+    """Key of a generated SQL query in the persistent cache"""
+    digest = hashlib.blake2b(template.encode(), digest_size=16)
+    digest.update(schema_key)
+    return f"{_SQL_PROMPT_VERSION}:{digest.hexdigest()}"
+
+def _open_sql_disk_cache() -> Optional[shelve.Shelf]:
+    """Open the persistent SQL cache if SQL_CACHE_PATH is configured"""
+    if not config.SQL_CACHE_PATH:
+        return None
+    try:
+        return shelve.open(config.SQL_CACHE_PATH)
+    except Exception as e:
+        logger.error(f"Failed to open SQL cache at {config.SQL_CACHE_PATH}: {e}")
+        return None
+
+@lru_cache(maxsize=4)
+def _make_llm(model: str, temperature: float) -> ChatOpenAI:
+    """Create a ChatOpenAI instance, shared by every LLMService using the same settings"""
+    return ChatOpenAI(
+        model=model,
+        temperature=temperature,
+        api_key=config.OPENAI_API_KEY,
+        request_timeout=config.OPENAI_REQUEST_TIMEOUT,
+        max_retries=config.OPENAI_MAX_RETRIES,
+        http_client=http_client,
+        http_async_client=http_async_client
+    )
+
+@lru_cache(maxsize=1)
+def _make_openai_client() -> AsyncOpenAI:
+    """Create the raw async OpenAI client on the shared HTTP client"""
+    return AsyncOpenAI(
+        api_key=config.OPENAI_API_KEY,
+        http_client=http_async_client
+    )
+
+class _SchemaPrompt(NamedTuple):
+    """Schema prompt rendered for one table_info, in every form the request paths need"""
+    table_info: Optional[Dict]
+    key: bytes
+    text: str
+    json: Optional[orjson.Fragment]
+
+class LLMService:
+    def __init__(self):
+        self.llm = None
+        self.fast_llm = None
+        self.strong_llm = None
+        self.client = None
+        # Generated SQL templates keyed on (normalized question, schema key)
+        self._sql_cache = LRUCache(maxsize=1024)
+        self._sql_cache_lock = threading.Lock()
+        # Optional second tier on disk, also guarded by _sql_cache_lock
+        self._sql_disk_cache = _open_sql_disk_cache()
+        # Suggested questions per schema; the schema rarely changes so an hour is fine
+        self._suggestion_cache = TTLCache(maxsize=4, ttl=3600)
+        self._suggestion_cache_lock = threading.Lock()
+        # Keep async OpenAI calls under the account quota: queue locally instead of getting 429s
+        self._semaphore = asyncio.Semaphore(config.OPENAI_MAX_CONCURRENCY)
+        self._rate_limiter = AsyncLimiter(config.OPENAI_REQUESTS_PER_MINUTE, 60)
+        self._schema_prompt = _SchemaPrompt(None, b"", "", None)
+        self.batch_explainer = BatchExplainer(
+            self, config.EXPLAIN_BATCH_SIZE, config.EXPLAIN_BATCH_WINDOW_MS / 1000
+        )
+        self.initialize_llm()
+    
+    def initialize_llm(self):
+        """Initialize the LLM with OpenAI"""
+        try:
+            if not config.OPENAI_API_KEY:
+                raise ValueError("OpenAI API key not found in environment variables")
             
-            # Create messages for the LLM
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_prompt)
-            ]
-            
-            # Get response from LLM
-            response = self.llm.invoke(messages)
-            sql_query = response.content.strip()
+            # SQL generation tries the fast model first and escalates to the
+            # strong one; explanations, suggestions and batches use the strong one
+            self.fast_llm = _make_llm(FAST_MODEL, 0.1)
+            self.strong_llm = _make_llm(STRONG_MODEL, 0.1)
+            self.llm = self.strong_llm
+            # Raw client for endpoints LangChain does not wrap (e.g. the Batch API)
+            self.client = _make_openai_client()
+            logger.info("LLM service initialized successfully")
             
-            # Clean up the response to ensure it's only SQL
-            if sql_query.startswith("```sql"):
-                sql_query = sql_query.replace("```sql", "").replace("```", "").strip()
-            elif sql_query.startswith("```"):
-                sql_query = sql_query.replace("```", "").strip()
+        except Exception as e:
+            logger.error(f"Failed to initialize LLM service: {e}")
+            raise
+    
+    @asynccontextmanager
+    async def _throttle(self):
+        """Bound the number of in-flight OpenAI calls and their request rate"""
+        async with self._semaphore, self._rate_limiter:
+            yield
+    
+    def get_database_schema_prompt(self, table_info: Dict) -> str:
+        """Generate a comprehensive database schema description for the LLM"""
+        return _render_schema_prompt(_schema_key(table_info))
+    
+    def warm_schema_prompt(self, table_info: Dict) -> _SchemaPrompt:
+        """Render the schema prompt once and keep both its str and JSON-encoded forms"""
+        schema_key = _schema_key(table_info)
+        text = _render_schema(schema_key)
+        self._schema_prompt = _SchemaPrompt(table_info, schema_key, text, orjson.Fragment(orjson.dumps(text)))
+        return self._schema_prompt
+    
+    def _get_schema_prompt(self, table_info: Dict) -> _SchemaPrompt:
+        """Return the warmed schema prompt, re-rendering only when a different table_info is passed"""
+        schema_prompt = self._schema_prompt
+        if schema_prompt.table_info is not table_info:
+            schema_prompt = self.warm_schema_prompt(table_info)
+        return schema_prompt
+    
+    def _build_sql_messages(self, user_question: str, table_info: Dict) -> List:
+        """Build the chat messages used to generate a SQL query"""
+        # Static content first, dynamic content last so the prefix stays cacheable
+        return [
+            SystemMessage(content=STATIC_RULES_PREFIX),
+            SystemMessage(content=self._get_schema_prompt(table_info).text),
+            HumanMessage(content=f"{SQL_REQUEST_INSTRUCTIONS}\nUser Question: {user_question}\n")
+        ]
+    
+    def _clean_sql_response(self, content: str) -> str:
+        """Clean up the raw LLM response so that only executable SQL remains"""
+        # Strip markdown code fences
+        sql_query = _FENCE_RE.sub("", content).strip()
+        
+        # Replace explanatory refusals with a query that returns nothing
+        if _REFUSAL_RE.search(sql_query):
+            return "SELECT 1 LIMIT 0; -- No valid query could be generated"
+        
+        # Replace placeholder text like [Enter value here] with valid SQL
+        sql_query = _PLACEHOLDER_RE.sub("1", sql_query)
+        
+        # Ensure it ends with semicolon
+        if not sql_query.endswith(";"):
+            sql_query += ";"
+        
+        return sql_query
+    
+    def _get_cached_sql(self, user_question: str, table_info: Dict) -> Optional[str]:
+        """Return cached SQL for an equivalent question, re-substituting its stock numbers"""
+        template, numbers = _normalize_question(user_question)
+        cache_key = (template, self._get_schema_prompt(table_info).key)
+        with self._sql_cache_lock:
+            sql_template = self._sql_cache.get(cache_key)
+            if sql_template is None and self._sql_disk_cache is not None:
+                sql_template = self._sql_disk_cache.get(_sql_disk_key(*cache_key))
+                if sql_template is not None:
+                    self._sql_cache[cache_key] = sql_template
+        
+        if sql_template is None:
+            return None
+        
+        for i, number in enumerate(numbers):
+            sql_template = sql_template.replace(f"<NRNUM{i}>", number)
+        return sql_template
+    
+    def _cache_sql(self, user_question: str, table_info: Dict, sql_query: str):
+        """Store generated SQL with the question's stock numbers templated out"""
+        if sql_query.startswith("SELECT 1 LIMIT 0"):
+            return
+        
+        template, numbers = _normalize_question(user_question)
+        # Only template when every number maps to exactly one spot in the SQL:
+        # repeated or nested numbers (230011 / 2300112) would be ambiguous
+        if len(set(numbers)) != len(numbers) or any(
+            a != b and a in b for a in numbers for b in numbers
+        ):
+            return
+        
+        sql_template = sql_query
+        for i, number in sorted(enumerate(numbers), key=lambda item: -len(item[1])):
+            sql_template, count = re.subn(rf"\b{number}\b", f"<NRNUM{i}>", sql_template)
+            if count != 1:
+                return
+        
+        cache_key = (template, self._get_schema_prompt(table_info).key)
+        with self._sql_cache_lock:
+            self._sql_cache[cache_key] = sql_template
+            if self._sql_disk_cache is not None:
+                self._sql_disk_cache[_sql_disk_key(*cache_key)] = sql_template
+                self._sql_disk_cache.sync()
+    
+    def generate_sql_query(self, user_question: str, table_info: Dict) -> Dict:
+        """Generate SQL query from natural language question"""
+        try:
+            if not self.llm:
+                raise ValueError("LLM not initialized")
             
-            # Remove any explanatory text that might have been included
-            if "I'm sorry" in sql_query or "I cannot" in sql_query or "does not contain" in sql_query:
-                sql_query = "SELECT 1 LIMIT 0; -- No valid query could be generated"
+            sql_query = self._get_cached_sql(user_question, table_info)
+            if sql_query is None:
+                messages = self._build_sql_messages(user_question, table_info)
+                
+                # Try the fast model first, escalate to the strong one if its SQL is unusable
+                response = self.fast_llm.invoke(messages)
+                sql_query = self._clean_sql_response(response.content)
+                if not _is_usable_sql(sql_query):
+                    logger.info("Escalating SQL generation to the strong model")
+                    response = self.strong_llm.invoke(messages)
+                    sql_query = self._clean_sql_response(response.content)
+                    if not _is_usable_sql(sql_query):
+                        raise ValueError("The model did not produce a single SELECT query")
+                self._cache_sql(user_question, table_info, sql_query)
+                
+                logger.info(f"Generated SQL query: {sql_query}")
             
-            # Check for placeholder text and replace with valid SQL
-            if "[Enter" in sql_query or "[specific" in sql_query or "[value" in sql_query:
-                # Replace common placeholders with valid SQL
-                sql_query = sql_query.replace("[Enter Stock Nrnum Here]", "1")  # Use first stock as example
-                sql_query = sql_query.replace("[Enter specific value]", "1")
-                sql_query = sql_query.replace("[value]", "1")
-                sql_query = sql_query.replace("[Enter value here]", "1")
+            return {
+                'status': 'success',
+                'sql_query': sql_query,
+                'original_question': user_question
+            }
             
-            # Ensure it ends with semicolon
-            if not sql_query.endswith(";"):
-                sql_query += ";"
+        except Exception as e:
+            logger.error(f"Error generating SQL query: {e}")
+            return {
+                'status': 'error',
+                'message': str(e),
+                'original_question': user_question
+            }
+    
+    async def agenerate_sql_query(self, user_question: str, table_info: Dict) -> Dict:
+        """Async variant of generate_sql_query that does not block the event loop"""
+        try:
+            if not self.llm:
+                raise ValueError("LLM not initialized")
             
-            logger.info(f"Generated SQL query: {sql_query}")
+            sql_query = self._get_cached_sql(user_question, table_info)
+            if sql_query is None:
+                messages = self._build_sql_messages(user_question, table_info)
+                
+                async with self._throttle():
+                    response = await self.fast_llm.ainvoke(messages)
+                sql_query = self._clean_sql_response(response.content)
+                if not _is_usable_sql(sql_query):
+                    logger.info("Escalating SQL generation to the strong model")
+                    async with self._throttle():
+                        response = await self.strong_llm.ainvoke(messages)
+                    sql_query = self._clean_sql_response(response.content)
+                    if not _is_usable_sql(sql_query):
+                        raise ValueError("The model did not produce a single SELECT query")
+                self._cache_sql(user_question, table_info, sql_query)
+                
+                logger.info(f"Generated SQL query: {sql_query}")
             
             return {
                 'status': 'success',
@@ -168,32 +443,139 @@ IMPORTANT: Never use placeholder text like [Enter value here] - use actual SQL s
                 'original_question': user_question
             }
     
-    def explain_results(self, question: str, results: List[Dict], sql_query: str) -> str:
-        """Generate a natural language explanation of the query results"""
+    async def submit_batch(self, questions: List[str], table_info: Dict) -> Dict:
+        """Submit SQL generation for many questions through the OpenAI Batch API"""
         try:
-            if not self.llm:
+            if not self.client:
                 raise ValueError("LLM not initialized")
             
-            # Prepare the results summary
-            result_count = len(results)
-            sample_data = results[:3] if results else []
+            # The system messages are identical for every question, so they are
+            # JSON-encoded once and spliced into each line as a pre-encoded fragment
+            system_messages = [
+                orjson.Fragment(orjson.dumps({'role': 'system', 'content': STATIC_RULES_PREFIX})),
+                orjson.Fragment(orjson.dumps({'role': 'system', 'content': self._get_schema_prompt(table_info).json}))
+            ]
+            
+            # One chat completion request per question, custom_id is the question index
+            lines = []
+            for i, question in enumerate(questions):
+                lines.append(orjson.dumps({
+                    'custom_id': str(i),
+                    'method': 'POST',
+                    'url': '/v1/chat/completions',
+                    'body': {
+                        'model': self.llm.model_name,
+                        'temperature': self.llm.temperature,
+                        'messages': [
+                            *system_messages,
+                            {'role': 'user', 'content': f"{SQL_REQUEST_INSTRUCTIONS}\nUser Question: {question}\n"}
+                        ]
+                    }
+                }))
+            
+            batch_file = await self.client.files.create(
+                file=("sql_batch.jsonl", b"\n".join(lines)),
+                purpose="batch"
+            )
+            batch = await self.client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+            logger.info(f"Submitted batch {batch.id} with {len(questions)} questions")
+            
+            return {
+                'status': 'success',
+                'batch_id': batch.id,
+                'batch_status': batch.status
+            }
+            
+        except Exception as e:
+            logger.error(f"Error submitting batch: {e}")
+            return {
+                'status': 'error',
+                'message': str(e)
+            }
+    
+    async def get_batch_results(self, batch_id: str) -> Dict:
+        """Get the status of a submitted batch and its generated SQL once completed"""
+        try:
+            if not self.client:
+                raise ValueError("LLM not initialized")
+            
+            batch = await self.client.batches.retrieve(batch_id)
+            counts = batch.request_counts
+            response = {
+                'status': 'success',
+                'batch_id': batch.id,
+                'batch_status': batch.status,
+                'request_counts': {
+                    'total': counts.total,
+                    'completed': counts.completed,
+                    'failed': counts.failed
+                } if counts else None
+            }
             
-            explanation_prompt = f"""
-Original Question: {question}
+            if batch.status != 'completed' or not batch.output_file_id:
+                return response
+            
+            output = await self.client.files.content(batch.output_file_id)
+            results = []
+            for line in output.text.splitlines():
+                if not line.strip():
+                    continue
+                item = orjson.loads(line)
+                body = (item.get('response') or {}).get('body') or {}
+                if item.get('error') or not body.get('choices'):
+                    results.append({
+                        'custom_id': item['custom_id'],
+                        'error_message': str(item.get('error') or body.get('error'))
+                    })
+                else:
+                    results.append({
+                        'custom_id': item['custom_id'],
+                        'sql_query': self._clean_sql_response(body['choices'][0]['message']['content'])
+                    })
+            
+            # Output order is not guaranteed, restore submission order
+            response['results'] = sorted(results, key=lambda r: int(r['custom_id']))
+            return response
+            
+        except Exception as e:
+            logger.error(f"Error retrieving batch {batch_id}: {e}")
+            return {
+                'status': 'error',
+                'batch_id': batch_id,
+                'message': str(e)
+            }
+    
+    def _describe_results(self, question: str, results: List[Dict], sql_query: str) -> str:
+        """Summarize a question and its results for an explanation prompt"""
+        # Prepare the results summary
+        result_count = len(results)
+        sample_data = results[:3] if results else []
+        
+        return f"""Original Question: {question}
 SQL Query Used: {sql_query}
 Number of Results: {result_count}
 
 Sample Results: {sample_data}
-
-Please provide a natural language explanation of these results. 
-Make it conversational and easy to understand for a non-technical user.
-Include insights about what the data shows and any notable patterns.
 """
+    
+    def _build_explanation_messages(self, question: str, results: List[Dict], sql_query: str) -> List:
+        """Build the chat messages used to explain query results"""
+        return [
+            SystemMessage(content=EXPLANATION_SYSTEM_PROMPT),
+            HumanMessage(content=self._describe_results(question, results, sql_query))
+        ]
+    
+    def explain_results(self, question: str, results: List[Dict], sql_query: str) -> str:
+        """Generate a natural language explanation of the query results"""
+        try:
+            if not self.llm:
+                raise ValueError("LLM not initialized")
             
-            messages = [
-                SystemMessage(content="You are a helpful financial data analyst. Explain stock market data in clear, understandable terms."),
-                HumanMessage(content=explanation_prompt)
-            ]
+            messages = self._build_explanation_messages(question, results, sql_query)
             
             response = self.llm.invoke(messages)
             return response.content.strip()
@@ -202,15 +584,102 @@ Include insights about what the data shows and any notable patterns.
             logger.error(f"Error explaining results: {e}")
             return f"Found {len(results)} results for your query. Please review the data for specific insights."
     
-    def suggest_questions(self, table_info: Dict) -> List[str]:
-        """Suggest example questions based on the database schema"""
+    async def aexplain_results(self, question: str, results: List[Dict], sql_query: str) -> str:
+        """Async variant of explain_results"""
+        try:
+            if not self.llm:
+                raise ValueError("LLM not initialized")
+            
+            messages = self._build_explanation_messages(question, results, sql_query)
+            
+            async with self._throttle():
+                response = await self.llm.ainvoke(messages)
+            return response.content.strip()
+            
+        except Exception as e:
+            logger.error(f"Error explaining results: {e}")
+            return f"Found {len(results)} results for your query. Please review the data for specific insights."
+    
+    def _build_batch_explanation_messages(self, items: List[Tuple[str, List[Dict], str]]) -> List:
+        """Build one prompt that explains the results of several queries at once"""
+        queries = "\n".join(
+            f"Query {index}:\n{self._describe_results(*item)}"
+            for index, item in enumerate(items, 1)
+        )
+        
+        explanation_prompt = f"""
+Explain the results of each of the following {len(items)} queries separately.
+
+{queries}
+Return ONLY a JSON array of {len(items)} strings, one explanation per query, in the same order.
+"""
+        
+        return [
+            SystemMessage(content=EXPLANATION_SYSTEM_PROMPT),
+            HumanMessage(content=explanation_prompt)
+        ]
+    
+    def _parse_batch_explanations(self, content: str, count: int) -> Optional[List[str]]:
+        """Parse the JSON array of explanations, None if it does not match the batch"""
+        content = content.strip()
+        if content.startswith("```"):
+            content = content.strip("`").removeprefix("json").strip()
+        try:
+            explanations = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            return None
+        if (not isinstance(explanations, list) or len(explanations) != count
+                or not all(isinstance(e, str) for e in explanations)):
+            return None
+        return [e.strip() for e in explanations]
+    
+    async def aexplain_results_batch(self, items: List[Tuple[str, List[Dict], str]]) -> List[str]:
+        """Explain the results of several queries with a single LLM call"""
+        if len(items) == 1:
+            return [await self.aexplain_results(*items[0])]
+        
+        explanations = None
         try:
             if not self.llm:
                 raise ValueError("LLM not initialized")
             
-            schema_prompt = self.get_database_schema_prompt(table_info)
+            messages = self._build_batch_explanation_messages(items)
+            
+            async with self._throttle():
+                response = await self.llm.ainvoke(messages)
+            explanations = self._parse_batch_explanations(response.content, len(items))
+            if explanations is None:
+                logger.warning(f"Unusable batch explanation response for {len(items)} queries, explaining individually")
             
-            suggestion_prompt = f"""
+        except Exception as e:
+            logger.error(f"Error explaining batched results: {e}")
+        
+        if explanations is None:
+            explanations = await asyncio.gather(*(self.aexplain_results(*item) for item in items))
+        return explanations
+    
+    async def aexplain_results_stream(self, question: str, results: List[Dict], sql_query: str) -> AsyncIterator[str]:
+        """Stream the natural language explanation of the query results token by token"""
+        try:
+            if not self.llm:
+                raise ValueError("LLM not initialized")
+            
+            messages = self._build_explanation_messages(question, results, sql_query)
+            
+            async with self._throttle():
+                async for chunk in self.llm.astream(messages):
+                    if chunk.content:
+                        yield chunk.content
+            
+        except Exception as e:
+            logger.error(f"Error explaining results: {e}")
+            yield f"Found {len(results)} results for your query. Please review the data for specific insights."
+    
+    def _build_suggestion_messages(self, table_info: Dict) -> List:
+        """Build the chat messages used to suggest example questions"""
+        schema_prompt = self.get_database_schema_prompt(table_info)
+        
+        suggestion_prompt = f"""
 {schema_prompt}
 
 Based on this database schema, suggest 5-8 interesting and useful questions that users could ask about the stock data.
@@ -219,29 +688,118 @@ Make the questions natural and conversational.
 
 Return only the questions, one per line, no numbering or additional text.
 """
+        
+        return [
+            SystemMessage(content="You are a financial data analyst. Suggest useful questions for stock market analysis."),
+            HumanMessage(content=suggestion_prompt)
+        ]
+    
+    def _parse_suggestions(self, content: str) -> List[str]:
+        """Split the LLM response into a clean list of questions"""
+        suggestions = content.strip().split('\n')
+        
+        # Clean up suggestions
+        return [s.strip() for s in suggestions if s.strip()]
+    
+    def suggest_questions(self, table_info: Dict) -> List[str]:
+        """Suggest example questions based on the database schema"""
+        try:
+            if not self.llm:
+                raise ValueError("LLM not initialized")
             
-            messages = [
-                SystemMessage(content="You are a financial data analyst. Suggest useful questions for stock market analysis."),
-                HumanMessage(content=suggestion_prompt)
-            ]
+            schema_key = self._get_schema_prompt(table_info).key
+            with self._suggestion_cache_lock:
+                suggestions = self._suggestion_cache.get(schema_key)
+            if suggestions is not None:
+                return list(suggestions)
+            
+            messages = self._build_suggestion_messages(table_info)
             
             response = self.llm.invoke(messages)
-            suggestions = response.content.strip().split('\n')
+            suggestions = self._parse_suggestions(response.content)
+            with self._suggestion_cache_lock:
+                self._suggestion_cache[schema_key] = tuple(suggestions)
+            return suggestions
+            
+        except Exception as e:
+            logger.error(f"Error generating question suggestions: {e}")
+            return list(DEFAULT_SUGGESTIONS)
+    
+    async def asuggest_questions(self, table_info: Dict) -> List[str]:
+        """Async variant of suggest_questions"""
+        try:
+            if not self.llm:
+                raise ValueError("LLM not initialized")
+            
+            schema_key = self._get_schema_prompt(table_info).key
+            with self._suggestion_cache_lock:
+                suggestions = self._suggestion_cache.get(schema_key)
+            if suggestions is not None:
+                return list(suggestions)
             
-            # Clean up suggestions
-            suggestions = [s.strip() for s in suggestions if s.strip()]
+            messages = self._build_suggestion_messages(table_info)
             
+            async with self._throttle():
+                response = await self.llm.ainvoke(messages)
+            suggestions = self._parse_suggestions(response.content)
+            with self._suggestion_cache_lock:
+                self._suggestion_cache[schema_key] = tuple(suggestions)
             return suggestions
             
         except Exception as e:
             logger.error(f"Error generating question suggestions: {e}")
-            return [
-                "Which stocks have a price above the moving average 50?",
-                "Which stocks had the highest volume increase today?",
-                "Show me stocks with positive price changes in the last week",
-                "Which stocks have upcoming earnings announcements?",
-                "Find stocks with consistent price increases over the last month"
-            ]
+            return list(DEFAULT_SUGGESTIONS)
+
+class BatchExplainer:
+    """Coalesce concurrent explanation requests into shared LLM calls"""
+    
+    def __init__(self, llm_service: LLMService, max_batch: int, max_wait: float):
+        self.llm_service = llm_service
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._pending: List[Tuple[Tuple[str, List[Dict], str], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+    
+    async def submit(self, question: str, results: List[Dict], sql_query: str) -> str:
+        """Queue a question for explanation and wait for its share of the batch"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(((question, results, sql_query), future))
+        
+        # Flush when the batch is full, otherwise after a short window
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+    
+    def _flush(self):
+        """Dispatch everything queued so far as one batch"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._explain(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _explain(self, batch: List[Tuple[Tuple[str, List[Dict], str], asyncio.Future]]):
+        """Run one batched explanation call and hand each caller its explanation"""
+        try:
+            explanations = await self.llm_service.aexplain_results_batch([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future), explanation in zip(batch, explanations):
+            if not future.done():
+                future.set_result(explanation)
 
-# Global LLM service instance
-llm_service = LLMService() 
\ No newline at end of file
+@lru_cache(maxsize=None)
+def get_llm_service() -> LLMService:
+    """Return the shared LLM service, created on first use"""
+    return LLMService() 
\ No newline at end of file
@@ -1,15 +1,22 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, StreamingResponse
+import asyncio
 import logging
+import orjson
+from contextlib import ExitStack
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List
+from pydantic import BaseModel
 
 from models.schemas import (
-    QueryRequest, QueryResponse, QuestionSuggestionResponse,
-    DatabaseStatusResponse, HealthCheckResponse, ErrorResponse
+    QueryRequest, QueryResponse, QuestionSuggestionResponse, BatchQueryResponse,
+    BatchSymbolRequest, TrendBatchResponse, DatabaseStatusResponse, HealthCheckResponse, ErrorResponse
 )
 from services.stock_ai_service import stock_ai_service
+from services.enhanced_query_processor import enhanced_query_processor
+from database.connection import get_async_db, get_db
 from config import config
 
 # Configure logging
@@ -22,7 +29,8 @@ app = FastAPI(
     description="AI-powered stock market data analysis system with natural language querying and semantic understanding",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -39,18 +47,25 @@ async def startup_event():
     """Initialize services on startup"""
     logger.info("Starting Stock AI Analysis System...")
     try:
-        # Test database connection
-        db_status = stock_ai_service.get_database_status()
+        # Test database and LLM connections concurrently, the LLM check
+        # also creates the shared LLM service
+        db_status, llm_available = await asyncio.gather(
+            asyncio.to_thread(stock_ai_service.get_database_status),
+            asyncio.to_thread(stock_ai_service.test_llm_connection)
+        )
+        
         if db_status['status'] == 'connected':
             logger.info("Database connection established")
         else:
             logger.warning(f"Database connection issue: {db_status.get('message', 'Unknown error')}")
         
-        # Test LLM connection
-        if stock_ai_service.test_llm_connection():
+        if llm_available:
             logger.info("LLM service initialized")
         else:
             logger.warning("LLM service not available")
+        
+        if db_status['status'] == 'connected' and llm_available:
+            stock_ai_service.warm_schema_prompt(db_status['tables'])
             
     except Exception as e:
         logger.error(f"Startup error: {e}")
@@ -60,8 +75,11 @@ async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down Stock AI Analysis System...")
     try:
-        from database.connection import db
-        db.close()
+        get_db().close()
+        await get_async_db().close()
+        
+        from ai.llm_service import close_http_clients
+        await close_http_clients()
     except Exception as e:
         logger.error(f"Shutdown error: {e}")
 
@@ -79,12 +97,15 @@ async def root():
 async def health_check():
     """Health check endpoint"""
     try:
-        db_status = stock_ai_service.get_database_status()
-        llm_available = stock_ai_service.test_llm_connection()
+        # A SELECT 1 is enough here, /database/status does the schema introspection
+        database_connected, llm_available = await asyncio.gather(
+            stock_ai_service.acheck_database(),
+            asyncio.to_thread(stock_ai_service.test_llm_connection)
+        )
         
         return HealthCheckResponse(
-            status="healthy" if db_status['status'] == 'connected' and llm_available else "degraded",
-            database_connected=db_status['status'] == 'connected',
+            status="healthy" if database_connected and llm_available else "degraded",
+            database_connected=database_connected,
             llm_available=llm_available,
             timestamp=datetime.now()
         )
@@ -117,6 +138,14 @@ async def get_database_status():
             message=str(e)
         )
 
+def _model_response(model: BaseModel) -> Response:
+    """Serialize a response model straight to JSON bytes with Pydantic
+    
+    Skips FastAPI re-validating the model against response_model and the
+    intermediate dict, which adds up for results with many rows.
+    """
+    return Response(model.model_dump_json(), media_type="application/json")
+
 @app.post("/query", response_model=QueryResponse)
 async def process_query(request: QueryRequest):
     """Process natural language query and return results"""
@@ -124,24 +153,139 @@ async def process_query(request: QueryRequest):
         logger.info(f"Processing question: {request.question}")
         
         # Process the question using enhanced semantic understanding
-        result = stock_ai_service.process_question(request.question, request.limit)
+        result = await stock_ai_service.aprocess_question(request.question, request.limit)
         
-        return result
+        return _model_response(result)
         
     except Exception as e:
         logger.error(f"Query processing error: {e}")
-        return QueryResponse(
+        return _model_response(QueryResponse(
             status="error",
             question=request.question,
             error_message=f"Failed to process query: {str(e)}"
+        ))
+
+def _json_line(data: Any) -> bytes:
+    """Serialize to JSON with orjson, falling back to FastAPI's encoder for models and Decimals"""
+    return orjson.dumps(data, default=jsonable_encoder)
+
+def _sse_event(event: str, data: Any) -> bytes:
+    """Format a server-sent event with a JSON payload"""
+    return b"event: " + event.encode() + b"\ndata: " + _json_line(data) + b"\n\n"
+
+@app.post("/query/stream")
+async def stream_query(request: QueryRequest):
+    """Process natural language query and stream the results as server-sent events"""
+    async def event_stream():
+        try:
+            logger.info(f"Streaming question: {request.question}")
+            async for event, payload in stock_ai_service.astream_question(request.question, request.limit):
+                if event == 'explanation':
+                    yield _sse_event(event, {"content": payload})
+                else:
+                    yield _sse_event(event, payload)
+        except Exception as e:
+            logger.error(f"Query streaming error: {e}")
+            yield _sse_event("result", QueryResponse(
+                status="error",
+                question=request.question,
+                error_message=f"Failed to process query: {str(e)}"
+            ))
+        yield _sse_event("done", {})
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@app.post("/query/rows")
+async def stream_query_rows(request: QueryRequest):
+    """Generate SQL for the question and stream the result rows as NDJSON
+    
+    The first line holds the query metadata, every following line one result row.
+    """
+    logger.info(f"Streaming rows for question: {request.question}")
+    prepared = await stock_ai_service.aprepare_query(request.question, request.limit)
+    if prepared.status == "error":
+        return prepared
+    
+    def row_stream():
+        yield _json_line(prepared) + b"\n"
+        try:
+            for batch in get_db().execute_query_iter(prepared.sql_query):
+                for row in batch:
+                    yield _json_line(row) + b"\n"
+        except Exception as e:
+            logger.error(f"Row streaming error: {e}")
+            yield _json_line({"status": "error", "error_message": f"Query execution failed: {str(e)}"}) + b"\n"
+    
+    # Starlette iterates the sync generator in a worker thread
+    return StreamingResponse(row_stream(), media_type="application/x-ndjson")
+
+@app.post("/query/batch", response_model=BatchQueryResponse)
+async def submit_query_batch(requests: List[QueryRequest]):
+    """Submit many questions for SQL generation through the OpenAI Batch API (24h turnaround)"""
+    try:
+        logger.info(f"Submitting batch of {len(requests)} questions")
+        return await stock_ai_service.submit_question_batch([r.question for r in requests])
+    except Exception as e:
+        logger.error(f"Batch submission error: {e}")
+        return BatchQueryResponse(
+            status="error",
+            error_message=f"Failed to submit batch: {str(e)}"
+        )
+
+@app.get("/query/batch/{batch_id}", response_model=BatchQueryResponse)
+async def get_query_batch(batch_id: str):
+    """Get batch status; once completed, results hold the generated SQL in submission order"""
+    try:
+        return await stock_ai_service.get_question_batch(batch_id)
+    except Exception as e:
+        logger.error(f"Batch retrieval error for {batch_id}: {e}")
+        return BatchQueryResponse(
+            status="error",
+            batch_id=batch_id,
+            error_message=f"Failed to retrieve batch: {str(e)}"
+        )
+
+def get_db_connection():
+    """Request-scoped database connection shared by every query the endpoint runs
+    
+    Only for endpoints that talk to the database alone; endpoints that wait on
+    the LLM would hold a pooled connection for the whole call. Yields None
+    when no connection can be checked out, so the endpoint can report it.
+    """
+    with ExitStack() as stack:
+        try:
+            connection = stack.enter_context(get_db().connection())
+        except Exception as e:
+            logger.error(f"Database connection error: {e}")
+            connection = None
+        yield connection
+
+@app.post("/trend/current", response_model=TrendBatchResponse)
+async def get_current_trends(request: BatchSymbolRequest, connection=Depends(get_db_connection)):
+    """Get the current trend for many symbols at once, one database round trip for the whole list"""
+    if connection is None:
+        return TrendBatchResponse(
+            status="error",
+            error_message="Database connection not available"
+        )
+    
+    try:
+        return await asyncio.to_thread(stock_ai_service.get_current_trends, request.symbols, connection)
+    except Exception as e:
+        logger.error(f"Current trends error: {e}")
+        return TrendBatchResponse(
+            status="error",
+            error_message=f"Failed to get current trends: {str(e)}"
         )
 
 @app.get("/suggestions", response_model=QuestionSuggestionResponse)
 async def get_question_suggestions():
     """Get suggested questions based on semantic understanding"""
     try:
-        result = stock_ai_service.get_question_suggestions()
-        return result
+        return QuestionSuggestionResponse(
+            status="success",
+            suggestions=enhanced_query_processor.suggest_questions()
+        )
     except Exception as e:
         logger.error(f"Suggestions error: {e}")
         return QuestionSuggestionResponse(
@@ -154,7 +298,7 @@ async def get_question_suggestions():
 async def get_field_meanings():
     """Get semantic meanings of all database fields"""
     try:
-        meanings = stock_ai_service.get_field_meanings()
+        meanings = enhanced_query_processor.get_all_field_meanings()
         return {
             "status": "success",
             "field_meanings": meanings,
@@ -173,7 +317,7 @@ async def get_field_meanings():
 async def get_field_meaning(field_name: str):
     """Get semantic meaning of a specific database field"""
     try:
-        meaning = stock_ai_service.get_field_meaning(field_name)
+        meaning = enhanced_query_processor.get_field_meaning(field_name)
         if meaning:
             return {
                 "status": "success",
@@ -239,7 +383,7 @@ async def get_trend_value_meanings():
 async def global_exception_handler(request, exc):
     """Global exception handler"""
     logger.error(f"Unhandled exception: {exc}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "error": "Internal server error",
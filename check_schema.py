@@ -3,13 +3,16 @@
 Check database schema
 """
 
-from database.connection import db
+from database.connection import get_db
+
+NOT_NULL_MARK = "\n    [NOT NULL]"
+PRIMARY_KEY_MARK = "\n    [PRIMARY KEY]"
 
 def check_schema():
     """Check database schema"""
     print("=== Database Schema Check ===\n")
     
-    result = db.test_connection()
+    result = get_db().test_connection()
     print(f"Connection status: {result['status']}")
     
     if result['status'] == 'connected':
@@ -18,14 +21,13 @@ def check_schema():
         
         print("\n=== Table Details ===")
         for table_name, columns in result['tables'].items():
-            print(f"\nTable: {table_name}")
-            print("Columns:")
-            for col in columns:
-                print(f"  - {col['field']} ({col['type']})")
-                if col['null'] == 'NO':
-                    print("    [NOT NULL]")
-                if col['key'] == 'PRI':
-                    print("    [PRIMARY KEY]")
+            column_lines = "\n".join(
+                f"  - {col['field']} ({col['type']})"
+                f"{NOT_NULL_MARK if col['null'] == 'NO' else ''}"
+                f"{PRIMARY_KEY_MARK if col.get('key') == 'PRI' else ''}"
+                for col in columns
+            )
+            print(f"\nTable: {table_name}\nColumns:\n{column_lines}")
     else:
         print(f"Error: {result.get('message', 'Unknown error')}")
 
@@ -11,9 +11,32 @@ class Config:
     DB_USER = os.getenv("DB_USER", "root")
     DB_PASSWORD = os.getenv("DB_PASSWORD", "")
     DB_NAME = os.getenv("DB_NAME", "stock")
+    DB_SCHEMA = os.getenv("DB_SCHEMA", "public")  # PostgreSQL only
+    DB_UNIX_SOCKET = os.getenv("DB_UNIX_SOCKET")  # e.g. /var/run/mysqld/mysqld.sock when colocated
+    SCHEMA_CACHE_TTL = int(os.getenv("SCHEMA_CACHE_TTL", 300))  # seconds
+    SCHEMA_RETRY_DELAY = int(os.getenv("SCHEMA_RETRY_DELAY", 5))  # seconds to wait after a failed schema load
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))  # seconds
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 3600))  # seconds, keep below the server's wait_timeout
+    # Ping connections on checkout; only worth the extra round trip on high-latency links
+    DB_PRE_PING = os.getenv("DB_PRE_PING", "False").lower() == "true"
+    # Compress the MySQL protocol; pays off for large results over a slow link
+    DB_COMPRESS = os.getenv("DB_COMPRESS", "False").lower() == "true"
+    QUERY_CACHE_MAX_ROWS = int(os.getenv("QUERY_CACHE_MAX_ROWS", 1000))  # larger results are not cached
+    # File that keeps generated SQL across restarts (e.g. between test runs); empty disables it.
+    # Single-process use only, dbm files do not support concurrent writers.
+    SQL_CACHE_PATH = os.getenv("SQL_CACHE_PATH", "")
     
     # OpenAI Configuration
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", 16))
+    OPENAI_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", 500))
+    OPENAI_REQUEST_TIMEOUT = int(os.getenv("OPENAI_REQUEST_TIMEOUT", 30))  # seconds
+    OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", 3))
+    # Concurrent result explanations are coalesced into one LLM call
+    EXPLAIN_BATCH_SIZE = int(os.getenv("EXPLAIN_BATCH_SIZE", 8))
+    EXPLAIN_BATCH_WINDOW_MS = int(os.getenv("EXPLAIN_BATCH_WINDOW_MS", 50))
     
     # Application Configuration
     APP_HOST = os.getenv("APP_HOST", "0.0.0.0")
@@ -23,6 +46,8 @@ class Config:
     # Database URL
     @property
     def DATABASE_URL(self):
+        if self.DB_UNIX_SOCKET:
+            return f"mysql+pymysql://{self.DB_USER}:{self.DB_PASSWORD}@/{self.DB_NAME}?unix_socket={self.DB_UNIX_SOCKET}"
         return f"mysql+pymysql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
 config = Config() 
\ No newline at end of file
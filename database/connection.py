@@ -1,76 +1,217 @@
-import mysql.connector
-from mysql.connector import Error
-from sqlalchemy import create_engine, text
+import asyncio
+import aiomysql
+import asyncpg
+from mysql.connector import Error, HAVE_CEXT
+from mysql.connector.errors import PoolError
+from mysql.connector.pooling import CNX_POOL_MAXSIZE, MySQLConnectionPool
+from sqlalchemy import create_engine, make_url, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
 import logging
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import groupby
+import threading
+from cachetools import LRUCache, TLRUCache
+from operator import itemgetter
 from config import config
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+# Driver loggers format every statement at INFO/DEBUG, keep them quiet
+logging.getLogger("mysql.connector").setLevel(logging.WARNING)
+logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
+
+# Column introspection for PostgreSQL, built once so SQLAlchemy compiles it once
+_PG_COLUMNS_QUERY = text("""
+    SELECT table_name, column_name, data_type, is_nullable, column_default
+    FROM information_schema.columns
+    WHERE table_schema = :schema
+    ORDER BY table_name, ordinal_position
+""")
+
+# Callbacks invoked whenever the cached schema is refreshed
+_schema_refresh_callbacks = []
+
+def on_schema_refresh(callback):
+    """Register a callback to run after DatabaseConnection.refresh_schema()"""
+    _schema_refresh_callbacks.append(callback)
+
+def detect_db_type():
+    """Detect database type from DATABASE_URL"""
+    if config.DATABASE_URL.startswith("postgresql://"):
+        return "postgresql"
+    return "mysql"
+
+def _until_next_day(_key, _value, now):
+    """Result cache expiry: the stock data updates daily, keep results until the next midnight"""
+    tomorrow = datetime.fromtimestamp(now).date() + timedelta(days=1)
+    return datetime.combine(tomorrow, datetime.min.time()).timestamp()
+
+def mysql_address():
+    """Connection address for MySQL: the UNIX socket when configured, otherwise host and port"""
+    if config.DB_UNIX_SOCKET:
+        # Colocated server, skip the TCP stack
+        return {'unix_socket': config.DB_UNIX_SOCKET}
+    return {'host': config.DB_HOST, 'port': config.DB_PORT}
+
+def _close_cursor(cursor):
+    """Close a prepared cursor, deallocating its statement; the connection may already be gone"""
+    try:
+        cursor.close()
+    except Error as e:
+        logger.debug("Closing prepared cursor failed: %s", e)
+
+class PreparedCursorCache(LRUCache):
+    """LRU cache of prepared cursors that closes the cursors it evicts
+    
+    Each prepared cursor holds a server-side statement, dropping it without
+    closing would leak the statement until its connection closes. There is
+    one cache per connection, only used by the thread holding it, so closing
+    never interleaves with a query another thread runs on that connection.
+    """
+    
+    def popitem(self):
+        key, cursor = super().popitem()
+        _close_cursor(cursor)
+        return key, cursor
 
 class DatabaseConnection:
     def __init__(self):
-        self.connection = None
+        self._pool = None
+        # get_connection() fails at once when the pool is empty, so checkouts
+        # wait on this semaphore (sized like the pool) instead
+        self._pool_slots = None
         self.engine = None
         self.SessionLocal = None
-        self.db_type = "mysql"  # Default to MySQL
-        
-    def detect_db_type(self):
-        """Detect database type from DATABASE_URL"""
-        if config.DATABASE_URL.startswith("postgresql://"):
-            self.db_type = "postgresql"
-        elif config.DATABASE_URL.startswith("mysql://"):
-            self.db_type = "mysql"
-        logger.info(f"Detected database type: {self.db_type}")
+        # DATABASE_URL does not change at runtime, detect the type once
+        self.db_type = detect_db_type()
+        logger.info("Detected database type: %s", self.db_type)
+        self._schema_cache = None
+        self._schema_cache_expiry = 0.0
+        # Per connection caches of prepared MySQL cursors keyed on SQL text, by
+        # server connection id; ids of dropped connections age out of the LRU
+        self._prepared_cursors = LRUCache(maxsize=2 * CNX_POOL_MAXSIZE)
+        self._prepared_cursors_lock = threading.Lock()
+        # Results of read-only queries run with cache=True, keyed on (SQL text, params)
+        self._result_cache = TLRUCache(maxsize=1024, ttu=_until_next_day, timer=time.time)
+        self._result_cache_lock = threading.Lock()
+        # Reentrant: connect() creates the engine while holding it
+        self._init_lock = threading.RLock()
         
     def connect(self):
-        """Establish database connection"""
-        try:
-            self.detect_db_type()
+        """Establish database connection pool, once even when first requests race"""
+        if self._pool:
+            return True
+        
+        with self._init_lock:
+            if self._pool:
+                return True
             
-            if self.db_type == "postgresql":
-                # For PostgreSQL, we'll use SQLAlchemy engine
-                return self.create_sqlalchemy_engine()
-            else:
-                # For MySQL, use mysql-connector-python
-                self.connection = mysql.connector.connect(
-                    host=config.DB_HOST,
-                    port=config.DB_PORT,
-                    user=config.DB_USER,
-                    password=config.DB_PASSWORD,
-                    database=config.DB_NAME,
-                    autocommit=True,
-                    charset='utf8mb4',
-                    collation='utf8mb4_unicode_ci'
-                )
-                
-                if self.connection.is_connected():
-                    logger.info("Successfully connected to MySQL database")
+            try:
+                if self.db_type == "postgresql":
+                    # For PostgreSQL, we'll use SQLAlchemy engine
+                    return self.create_sqlalchemy_engine()
+                else:
+                    # For MySQL, use a mysql-connector-python connection pool so
+                    # concurrent requests don't queue on a single socket
+                    if not HAVE_CEXT:
+                        logger.warning("MySQL C extension not available, rows will be decoded in pure Python")
+                    pool_size = self.pool_size()
+                    self._pool_slots = threading.BoundedSemaphore(pool_size)
+                    self._pool = MySQLConnectionPool(
+                        pool_name="stock_pool",
+                        pool_size=pool_size,
+                        # Connections are autocommit and never change session state;
+                        # skipping the reset keeps prepared statements across checkouts
+                        pool_reset_session=False,
+                        **mysql_address(),
+                        user=config.DB_USER,
+                        password=config.DB_PASSWORD,
+                        database=config.DB_NAME,
+                        autocommit=True,
+                        charset='utf8mb4',
+                        collation='utf8mb4_unicode_ci',
+                        # Decode rows in the libmysqlclient-backed C extension
+                        use_pure=not HAVE_CEXT,
+                        compress=config.DB_COMPRESS
+                    )
+                    logger.info("Successfully created MySQL connection pool")
                     return True
                     
-        except Error as e:
-            logger.error(f"Error connecting to database: {e}")
-            return False
+            except Error as e:
+                logger.error("Error connecting to database: %s", e)
+                return False
     
-    def create_sqlalchemy_engine(self):
-        """Create SQLAlchemy engine for ORM operations"""
+    def pool_size(self):
+        """Maximum number of connections checked out at once"""
+        if self.db_type == "postgresql":
+            return config.DB_POOL_SIZE + config.DB_MAX_OVERFLOW
+        return min(config.DB_POOL_SIZE, CNX_POOL_MAXSIZE)
+    
+    @contextmanager
+    def _get_mysql_connection(self):
+        """Check out a connection from the MySQL pool, waiting up to DB_POOL_TIMEOUT for a free one"""
+        if not self._pool:
+            self.connect()
+        pool, slots = self._pool, self._pool_slots
+        if not pool:
+            raise Error("MySQL connection pool is not available")
+        if not slots.acquire(timeout=config.DB_POOL_TIMEOUT):
+            raise PoolError(f"No MySQL connection available after {config.DB_POOL_TIMEOUT}s")
         try:
-            self.engine = create_engine(
-                config.DATABASE_URL,
-                pool_size=10,
-                max_overflow=20,
-                pool_pre_ping=True,
-                pool_recycle=3600
-            )
-            self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
-            logger.info("SQLAlchemy engine created successfully")
+            # Leaving the with-block returns the connection to the pool
+            with pool.get_connection() as conn:
+                yield conn
+        finally:
+            slots.release()
+    
+    def create_sqlalchemy_engine(self):
+        """Create SQLAlchemy engine for ORM operations, once even when first requests race"""
+        if self.engine:
             return True
+        
+        with self._init_lock:
+            if self.engine:
+                return True
             
-        except SQLAlchemyError as e:
-            logger.error(f"Error creating SQLAlchemy engine: {e}")
-            return False
+            try:
+                url = make_url(config.DATABASE_URL)
+                engine_options = {}
+                if self.db_type == "postgresql":
+                    # psycopg 3: statements run 5 times get prepared server-side,
+                    # executemany() INSERTs are folded into multi-row statements
+                    url = url.set(drivername="postgresql+psycopg")
+                    engine_options = {
+                        'connect_args': {'prepare_threshold': 5},
+                        'insertmanyvalues_page_size': 1000
+                    }
+                
+                engine = create_engine(
+                    url,
+                    pool_size=config.DB_POOL_SIZE,
+                    max_overflow=config.DB_MAX_OVERFLOW,
+                    pool_timeout=config.DB_POOL_TIMEOUT,
+                    pool_recycle=config.DB_POOL_RECYCLE,
+                    pool_pre_ping=config.DB_PRE_PING,
+                    # Reuse the most recently returned connection so idle ones can time out
+                    pool_use_lifo=True,
+                    pool_reset_on_return="rollback",
+                    query_cache_size=1200,
+                    **engine_options
+                )
+                self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+                # Publish the engine last, other threads only check self.engine
+                self.engine = engine
+                logger.info("SQLAlchemy engine created successfully")
+                return True
+                
+            except SQLAlchemyError as e:
+                logger.error("Error creating SQLAlchemy engine: %s", e)
+                return False
     
     def get_session(self):
         """Get database session"""
@@ -79,49 +220,71 @@ class DatabaseConnection:
         return self.SessionLocal()
     
     def test_connection(self):
-        """Test database connection and return table information"""
+        """Test database connection and return table information
+        
+        Results are cached for SCHEMA_CACHE_TTL, failures for SCHEMA_RETRY_DELAY
+        so that status checks do not keep waiting on a database that is down.
+        """
+        if self._schema_cache and time.monotonic() < self._schema_cache_expiry:
+            return self._schema_cache
+        
         try:
             if self.db_type == "postgresql":
-                return self._test_postgresql_connection()
+                status = self._test_postgresql_connection()
             else:
-                return self._test_mysql_connection()
+                status = self._test_mysql_connection()
+            ttl = config.SCHEMA_CACHE_TTL
                 
         except Exception as e:
-            logger.error(f"Database connection test failed: {e}")
-            return {
+            logger.error("Database connection test failed: %s", e)
+            status = {
                 'status': 'error',
                 'message': str(e)
             }
+            ttl = config.SCHEMA_RETRY_DELAY
+        
+        self._schema_cache = status
+        self._schema_cache_expiry = time.monotonic() + ttl
+        return status
+    
+    def refresh_schema(self):
+        """Drop the cached schema and introspect the database again"""
+        self._schema_cache = None
+        for callback in _schema_refresh_callbacks:
+            callback()
+        return self.test_connection()
     
     def _test_mysql_connection(self):
         """Test MySQL connection"""
-        if not self.connection or not self.connection.is_connected():
-            self.connect()
-        
-        cursor = self.connection.cursor()
-        
-        # Get table information
-        cursor.execute("SHOW TABLES")
-        tables = cursor.fetchall()
+        with self._get_mysql_connection() as conn:
+            cursor = conn.cursor()
+            
+            # Get all tables and columns in a single round trip
+            cursor.execute("""
+                SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE,
+                       COLUMN_KEY, COLUMN_DEFAULT, EXTRA
+                FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = %s
+                ORDER BY TABLE_NAME, ORDINAL_POSITION
+            """, (config.DB_NAME,))
+            rows = cursor.fetchall()
+            cursor.close()
         
-        table_info = {}
-        for table in tables:
-            table_name = table[0]
-            cursor.execute(f"DESCRIBE {table_name}")
-            columns = cursor.fetchall()
-            table_info[table_name] = [
+        table_info = {
+            table_name: [
                 {
-                    'field': col[0],
-                    'type': col[1],
-                    'null': col[2],
-                    'key': col[3],
-                    'default': col[4],
-                    'extra': col[5]
+                    'field': col[1],
+                    'type': col[2],
+                    'null': col[3],
+                    'key': col[4],
+                    'default': col[5],
+                    'extra': col[6]
                 }
                 for col in columns
             ]
+            for table_name, columns in groupby(rows, key=itemgetter(0))
+        }
         
-        cursor.close()
         return {
             'status': 'connected',
             'database': config.DB_NAME,
@@ -134,63 +297,112 @@ class DatabaseConnection:
             self.create_sqlalchemy_engine()
         
         with self.engine.connect() as connection:
-            # Get table information
-            result = connection.execute(text("""
-                SELECT table_name 
-                FROM information_schema.tables 
-                WHERE table_schema = 'public'
-            """))
-            tables = [row[0] for row in result]
-            
-            table_info = {}
-            for table in tables:
-                result = connection.execute(text(f"""
-                    SELECT column_name, data_type, is_nullable, column_default
-                    FROM information_schema.columns 
-                    WHERE table_name = '{table}'
-                    ORDER BY ordinal_position
-                """))
-                columns = result.fetchall()
-                table_info[table] = [
-                    {
-                        'field': col[0],
-                        'type': col[1],
-                        'null': col[2],
-                        'default': col[3]
-                    }
-                    for col in columns
-                ]
-            
-            return {
-                'status': 'connected',
-                'database': config.DB_NAME,
-                'tables': table_info
-            }
+            # Get all tables and columns in a single round trip
+            result = connection.execute(_PG_COLUMNS_QUERY, {'schema': config.DB_SCHEMA})
+            rows = result.fetchall()
+        
+        table_info = {
+            table_name: [
+                {
+                    'field': col[1],
+                    'type': col[2],
+                    'null': col[3],
+                    'default': col[4]
+                }
+                for col in columns
+            ]
+            for table_name, columns in groupby(rows, key=itemgetter(0))
+        }
+        
+        return {
+            'status': 'connected',
+            'database': config.DB_NAME,
+            'tables': table_info
+        }
     
-    def execute_query(self, query, params=None):
-        """Execute a query and return results"""
+    @contextmanager
+    def connection(self):
+        """Check out one connection to share across several queries, e.g. for a whole request"""
+        if self.db_type == "postgresql":
+            if not self.engine:
+                self.create_sqlalchemy_engine()
+            with self.engine.connect() as connection:
+                yield connection
+        else:
+            with self._get_mysql_connection() as connection:
+                yield connection
+    
+    @contextmanager
+    def _use_connection(self, connection=None):
+        """Yield the caller's connection, or check one out for the duration of the block"""
+        if connection is not None:
+            yield connection
+        else:
+            with self.connection() as connection:
+                yield connection
+    
+    def execute_query(self, query, params=None, connection=None, cache=False):
+        """Execute a query and return results, on the given connection if any
+        
+        With cache=True the result is reused until the next day boundary, so
+        only pass it for read-only queries over the daily stock data.
+        """
+        if not cache:
+            return self._execute_query(query, params, connection)
+        
+        key = (query, tuple(sorted(params.items())) if isinstance(params, dict) else tuple(params or ()))
+        with self._result_cache_lock:
+            result = self._result_cache.get(key)
+        if result is not None:
+            # Copies, so callers changing the result don't change the cache
+            return {**result, 'data': list(result['data'])}
+        
+        result = self._execute_query(query, params, connection)
+        # Empty results may just predate today's load, and large ones would
+        # crowd out the many small trend lookups
+        if result['status'] == 'success' and 0 < result['row_count'] <= config.QUERY_CACHE_MAX_ROWS:
+            with self._result_cache_lock:
+                self._result_cache[key] = {**result, 'data': list(result['data'])}
+        return result
+    
+    def clear_result_cache(self):
+        """Drop all cached query results, e.g. after writing to the tables they read"""
+        with self._result_cache_lock:
+            self._result_cache.clear()
+    
+    def _execute_query(self, query, params, connection):
+        """Execute a query without the result cache"""
         try:
-            if self.db_type == "postgresql":
-                return self._execute_postgresql_query(query, params)
-            else:
-                return self._execute_mysql_query(query, params)
+            with self._use_connection(connection) as conn:
+                if self.db_type == "postgresql":
+                    return self._execute_postgresql_query(conn, query, params)
+                else:
+                    return self._execute_mysql_query(conn, query, params)
                 
         except Exception as e:
-            logger.error(f"Query execution failed: {e}")
+            logger.error("Query execution failed: %s", e)
             return {
                 'status': 'error',
                 'message': str(e)
             }
     
-    def _execute_mysql_query(self, query, params=None):
+    def _execute_mysql_query(self, conn, query, params=None):
         """Execute MySQL query"""
-        if not self.connection or not self.connection.is_connected():
-            self.connect()
-        
-        cursor = self.connection.cursor(dictionary=True)
-        cursor.execute(query, params or ())
-        results = cursor.fetchall()
-        cursor.close()
+        if params:
+            # Parameterized queries repeat the same SQL text, so reuse the
+            # statement already prepared on this connection
+            cursor = self._get_prepared_cursor(conn, query)
+            try:
+                cursor.execute(query, params)
+                results = cursor.fetchall()
+            except Error:
+                self._drop_prepared_cursor(conn, query)
+                raise
+        else:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(query)
+            results = cursor.fetchall()
+            cursor.close()
         
         return {
             'status': 'success',
@@ -198,29 +410,248 @@ class DatabaseConnection:
             'row_count': len(results)
         }
     
-    def _execute_postgresql_query(self, query, params=None):
-        """Execute PostgreSQL query"""
+    def _get_prepared_cursor(self, conn, query):
+        """Return a prepared dict cursor for query on this connection, preparing it on first use"""
+        cursors = self._connection_cursors(conn)
+        cursor = cursors.get(query)
+        if cursor is None:
+            cursor = conn.cursor(prepared=True, dictionary=True)
+            # May evict and close another of this connection's cursors
+            cursors[query] = cursor
+        return cursor
+    
+    def _connection_cursors(self, conn):
+        """Prepared cursor cache of a checked-out connection, only to be used while holding it"""
+        with self._prepared_cursors_lock:
+            cursors = self._prepared_cursors.get(conn.connection_id)
+            if cursors is None:
+                cursors = self._prepared_cursors[conn.connection_id] = PreparedCursorCache(maxsize=64)
+        return cursors
+    
+    def _drop_prepared_cursor(self, conn, query):
+        """Forget a prepared cursor, e.g. after the statement failed or the connection dropped"""
+        cursor = self._connection_cursors(conn).pop(query, None)
+        if cursor is not None:
+            _close_cursor(cursor)
+    
+    def execute_query_iter(self, query, params=None, batch_size=1000):
+        """Execute a query and yield the results in batches of dict rows
+        
+        Unlike execute_query, rows are fetched from the server as they are
+        consumed, so memory stays constant regardless of the result size.
+        Errors are raised to the caller.
+        """
+        if self.db_type == "postgresql":
+            yield from self._iter_postgresql_query(query, params, batch_size)
+        else:
+            yield from self._iter_mysql_query(query, params, batch_size)
+    
+    @contextmanager
+    def unbuffered_cursor(self):
+        """Check out a pooled MySQL connection and yield an unbuffered dict cursor
+        
+        Rows stay on the server until they are fetched. Rows left unread when
+        the block exits are discarded so the connection goes back to the pool
+        in a clean state.
+        """
+        with self._get_mysql_connection() as conn:
+            cursor = conn.cursor(buffered=False, dictionary=True)
+            try:
+                yield cursor
+            finally:
+                conn.consume_results()
+                cursor.close()
+    
+    def _iter_mysql_query(self, query, params, batch_size):
+        """Stream MySQL query results with fetchmany"""
+        with self.unbuffered_cursor() as cursor:
+            cursor.execute(query, params or ())
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield batch
+    
+    def _iter_postgresql_query(self, query, params, batch_size):
+        """Stream PostgreSQL query results with a server-side cursor"""
         if not self.engine:
             self.create_sqlalchemy_engine()
         
         with self.engine.connect() as connection:
+            result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(text(query), params or {})
+            for partition in result.mappings().partitions(batch_size):
+                yield [dict(row) for row in partition]
+    
+    def _execute_postgresql_query(self, connection, query, params=None):
+        """Execute PostgreSQL query"""
+        if isinstance(params, (list, tuple)):
+            # Positional %s parameters are passed to the driver as-is
+            result = connection.exec_driver_sql(query, tuple(params))
+        else:
             result = connection.execute(text(query), params or {})
-            results = [dict(row) for row in result]
+        # RowMapping rows are dict-like, no per-row dict() copy needed
+        results = result.mappings().all()
+        
+        return {
+            'status': 'success',
+            'data': results,
+            'row_count': len(results)
+        }
+    
+    def execute_many(self, query, params_list):
+        """Execute a write statement for every parameter set in one batch
+        
+        Only the total affected row count is returned; drivers that rewrite
+        the batch into a single statement do not report per-row counts.
+        """
+        # Cached reads may now be stale
+        self.clear_result_cache()
+        try:
+            if self.db_type == "postgresql":
+                return self._execute_many_postgresql(query, params_list)
+            else:
+                return self._execute_many_mysql(query, params_list)
+                
+        except Exception as e:
+            logger.error("Batch execution failed: %s", e)
+            return {
+                'status': 'error',
+                'message': str(e)
+            }
+    
+    def _execute_many_mysql(self, query, params_list):
+        """Execute MySQL batch, INSERTs are sent as one multi-row statement"""
+        with self._get_mysql_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(query, params_list)
+            rowcount = cursor.rowcount
+            cursor.close()
+        
+        return {
+            'status': 'success',
+            'rowcount': rowcount
+        }
+    
+    def _execute_many_postgresql(self, query, params_list):
+        """Execute PostgreSQL batch in one transaction"""
+        if not self.engine:
+            self.create_sqlalchemy_engine()
+        
+        with self.engine.begin() as connection:
+            result = connection.execute(text(query), params_list)
             
             return {
                 'status': 'success',
-                'data': results,
-                'row_count': len(results)
+                'rowcount': result.rowcount
             }
     
     def close(self):
         """Close database connection"""
-        if self.db_type == "mysql" and self.connection and self.connection.is_connected():
-            self.connection.close()
-            logger.info("Database connection closed")
+        if self.db_type == "mysql" and self._pool:
+            # Other threads may still hold connections, so cursors are not
+            # closed here; the server frees them with their connection
+            with self._prepared_cursors_lock:
+                self._prepared_cursors = LRUCache(maxsize=2 * CNX_POOL_MAXSIZE)
+            # mysql-connector has no public API to close a pool, so it is only
+            # dropped; its sockets close once the pool and any connections
+            # still checked out are garbage collected
+            self._pool = None
+            logger.info("Database connection pool released")
         elif self.engine:
             self.engine.dispose()
             logger.info("Database engine disposed")
 
-# Global database instance
-db = DatabaseConnection() 
\ No newline at end of file
+class AsyncDatabaseConnection:
+    """asyncio counterpart of DatabaseConnection for queries issued from async endpoints
+    
+    Uses aiomysql or asyncpg pools so waiting on the server does not hold a
+    worker thread. asyncpg caches prepared statements per connection.
+    """
+    def __init__(self):
+        self._pool = None
+        self._pool_lock = asyncio.Lock()
+        self.db_type = detect_db_type()
+    
+    async def connect(self):
+        """Create the async connection pool"""
+        async with self._pool_lock:
+            if self._pool:
+                return
+            
+            if self.db_type == "postgresql":
+                self._pool = await asyncpg.create_pool(
+                    dsn=config.DATABASE_URL,
+                    min_size=1,
+                    max_size=config.DB_POOL_SIZE
+                )
+            else:
+                self._pool = await aiomysql.create_pool(
+                    **mysql_address(),
+                    user=config.DB_USER,
+                    password=config.DB_PASSWORD,
+                    db=config.DB_NAME,
+                    minsize=1,
+                    maxsize=config.DB_POOL_SIZE,
+                    autocommit=True,
+                    charset='utf8mb4',
+                    pool_recycle=config.DB_POOL_RECYCLE
+                )
+            logger.info("Successfully created async %s connection pool", self.db_type)
+    
+    async def execute_query(self, query, params=None):
+        """Execute a query and return results"""
+        try:
+            if not self._pool:
+                await self.connect()
+            
+            if self.db_type == "postgresql":
+                async with self._pool.acquire() as conn:
+                    rows = await conn.fetch(query, *(params or ()))
+                results = [dict(row) for row in rows]
+            else:
+                async with self._pool.acquire() as conn:
+                    async with conn.cursor(aiomysql.DictCursor) as cursor:
+                        # Without params aiomysql skips %-interpolation, so literal % (LIKE '%x%') is safe
+                        await cursor.execute(query, params)
+                        results = await cursor.fetchall()
+            
+            return {
+                'status': 'success',
+                'data': list(results),
+                'row_count': len(results)
+            }
+            
+        except Exception as e:
+            logger.error("Query execution failed: %s", e)
+            return {
+                'status': 'error',
+                'message': str(e)
+            }
+    
+    async def ping(self) -> bool:
+        """Check that the database answers with a single SELECT 1 round trip"""
+        result = await self.execute_query("SELECT 1")
+        return result['status'] == 'success'
+    
+    async def close(self):
+        """Close the async connection pool"""
+        if not self._pool:
+            return
+        
+        if self.db_type == "postgresql":
+            await self._pool.close()
+        else:
+            self._pool.close()
+            await self._pool.wait_closed()
+        self._pool = None
+        logger.info("Async database connection pool closed")
+
+@lru_cache(maxsize=None)
+def get_db() -> DatabaseConnection:
+    """Return the shared database instance, created on first use"""
+    return DatabaseConnection()
+
+@lru_cache(maxsize=None)
+def get_async_db() -> AsyncDatabaseConnection:
+    """Return the shared async database instance, created on first use"""
+    return AsyncDatabaseConnection() 
\ No newline at end of file
@@ -1,7 +1,13 @@
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional, Any
+from typing import Annotated, List, Dict, Optional, Any
 from datetime import datetime
 
+# Upper bound on symbols per batch lookup, keeps the IN (...) list well under packet limits
+MAX_BATCH_SYMBOLS = 500
+
+# Stock symbols are the numeric Nrnum codes
+StockSymbol = Annotated[str, Field(pattern=r"^\d+$")]
+
 class DatabaseStatusResponse(BaseModel):
     status: str
     database: Optional[str] = None
@@ -22,6 +28,28 @@ class QueryResponse(BaseModel):
     error_message: Optional[str] = None
     query_type: Optional[str] = None
 
+class BatchQueryResult(BaseModel):
+    custom_id: str
+    sql_query: Optional[str] = None
+    error_message: Optional[str] = None
+
+class BatchQueryResponse(BaseModel):
+    status: str
+    batch_id: Optional[str] = None
+    batch_status: Optional[str] = None
+    request_counts: Optional[Dict[str, int]] = None
+    results: Optional[List[BatchQueryResult]] = None
+    error_message: Optional[str] = None
+
+class BatchSymbolRequest(BaseModel):
+    symbols: List[StockSymbol] = Field(..., min_length=1, max_length=MAX_BATCH_SYMBOLS, description="Stock symbols (Nrnum) to look up")
+
+class TrendBatchResponse(BaseModel):
+    status: str
+    trends: Optional[List[Dict[str, Any]]] = None
+    row_count: Optional[int] = None
+    error_message: Optional[str] = None
+
 class QuestionSuggestionResponse(BaseModel):
     status: str
     suggestions: List[str]
@@ -1,18 +1,79 @@
+import asyncio
 import logging
-from typing import Dict, List, Optional, Any, Tuple
+import threading
+from typing import AsyncIterator, Dict, Mapping, Optional, Any, Tuple
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError
+from cachetools import TTLCache
 from services.semantic_mapping_service import semantic_mapping_service
-from ai.llm_service import llm_service
-from database.connection import db
+from ai.llm_service import LLMService, get_llm_service
+from database.connection import get_async_db, get_db
 from models.schemas import QueryResponse
 
 logger = logging.getLogger(__name__)
 
+# Example questions that the semantic patterns answer without the LLM
+SEMANTIC_SUGGESTIONS = (
+    "What is the trend on symbol 230011 today?",
+    "When was the last time symbol 230011 moved from uptrend to downtrend?",
+    "Show me the trend history for symbol 230011 over the last 7 days",
+    "What stocks have high volume today?",
+    "Which stocks are in uptrend this week?",
+    "Show me stocks with downtrend in the last month",
+    "What is the current price of symbol 230011?",
+    "Which stocks have the highest trading volume?",
+    "Show me stock names and their current trends",
+    "What stocks changed trend recently?"
+)
+
 class EnhancedQueryProcessor:
     """Enhanced query processor that combines semantic understanding with LLM"""
     
     def __init__(self):
         self.semantic_service = semantic_mapping_service
-        self.llm_service = llm_service
+        # Recent successful responses, so bursts of the same question skip the
+        # database round trip (and, for LLM questions, the explanation call)
+        self._response_cache = TTLCache(maxsize=256, ttl=60)
+        self._response_cache_lock = threading.Lock()
+        self._response_cache_hits = 0
+        self._response_cache_misses = 0
+    
+    @property
+    def llm_service(self) -> LLMService:
+        return get_llm_service()
+    
+    def _get_cached_response(self, cache_key: Tuple, question: str) -> Optional[QueryResponse]:
+        """Return a copy of a recently cached response, marked as served from cache"""
+        with self._response_cache_lock:
+            response = self._response_cache.get(cache_key)
+            if response is None:
+                self._response_cache_misses += 1
+                return None
+            self._response_cache_hits += 1
+        return response.model_copy(update={
+            'question': question,
+            'query_type': f"{response.query_type}_cached"
+        })
+    
+    def _cache_response(self, cache_key: Tuple, response: QueryResponse):
+        """Remember a successful response for a short while"""
+        with self._response_cache_lock:
+            self._response_cache[cache_key] = response
+    
+    def response_cache_stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current size of the response cache"""
+        with self._response_cache_lock:
+            return {
+                'hits': self._response_cache_hits,
+                'misses': self._response_cache_misses,
+                'size': len(self._response_cache)
+            }
+    
+    def clear_response_cache(self):
+        """Drop cached responses, e.g. after new stock data was loaded"""
+        with self._response_cache_lock:
+            self._response_cache.clear()
     
     def process_question(self, question: str, table_info: Dict, limit: int = 100) -> QueryResponse:
         """Process a natural language question using enhanced understanding"""
@@ -37,17 +98,145 @@ class EnhancedQueryProcessor:
                 error_message=f"Failed to process query: {str(e)}"
             )
     
+    async def aprocess_question(self, question: str, table_info: Dict, limit: int = 100) -> QueryResponse:
+        """Async variant of process_question that keeps the event loop free during LLM and DB calls"""
+        try:
+            question_type, context = self.semantic_service.classify_question_type(question)
+            
+            if question_type != 'general':
+                # Semantic queries only touch the database, run them off the event loop
+                semantic_result = await asyncio.to_thread(
+                    self._process_semantic_query, question, question_type, context
+                )
+                if semantic_result:
+                    return semantic_result
+            
+            return await self._aprocess_llm_query(question, table_info, limit)
+            
+        except Exception as e:
+            logger.error(f"Error in enhanced query processing: {e}")
+            return QueryResponse(
+                status="error",
+                question=question,
+                error_message=f"Failed to process query: {str(e)}"
+            )
+    
+    async def astream_question(self, question: str, table_info: Dict, limit: int = 100) -> AsyncIterator[Tuple[str, Any]]:
+        """Process a question and yield ('result', QueryResponse) followed by ('explanation', token) events"""
+        try:
+            question_type, context = self.semantic_service.classify_question_type(question)
+            
+            if question_type != 'general':
+                semantic_result = await asyncio.to_thread(
+                    self._process_semantic_query, question, question_type, context
+                )
+                if semantic_result:
+                    yield 'result', semantic_result
+                    return
+            
+            llm_response = await self.llm_service.agenerate_sql_query(question, table_info)
+            
+            if llm_response['status'] == 'error':
+                yield 'result', QueryResponse(
+                    status="error",
+                    question=question,
+                    error_message=f"Failed to generate SQL query: {llm_response['message']}"
+                )
+                return
+            
+            sql_query = self._ensure_limit(llm_response['sql_query'], limit)
+            query_result = await get_async_db().execute_query(sql_query)
+            
+            if query_result['status'] == 'error':
+                yield 'result', QueryResponse(
+                    status="error",
+                    question=question,
+                    sql_query=sql_query,
+                    error_message=f"Query execution failed: {query_result['message']}"
+                )
+                return
+            
+            results = query_result['data']
+            
+            # Send the data first, the explanation follows as it is generated
+            yield 'result', QueryResponse(
+                status="success",
+                question=question,
+                sql_query=sql_query,
+                results=results,
+                row_count=query_result['row_count'],
+                query_type="llm_generated"
+            )
+            
+            async for token in self.llm_service.aexplain_results_stream(question, results, sql_query):
+                yield 'explanation', token
+            
+        except Exception as e:
+            logger.error(f"Error in streaming query processing: {e}")
+            yield 'result', QueryResponse(
+                status="error",
+                question=question,
+                error_message=f"Failed to process query: {str(e)}"
+            )
+    
+    async def aprepare_query(self, question: str, table_info: Dict, limit: int = 100) -> QueryResponse:
+        """Generate the SQL for a question without executing it"""
+        try:
+            question_type, context = self.semantic_service.classify_question_type(question)
+            
+            if question_type != 'general':
+                sql_query = self.semantic_service.generate_contextual_sql(question, question_type, context)
+                if sql_query:
+                    return QueryResponse(
+                        status="success",
+                        question=question,
+                        sql_query=sql_query,
+                        query_type=f"semantic_{question_type}"
+                    )
+            
+            llm_response = await self.llm_service.agenerate_sql_query(question, table_info)
+            
+            if llm_response['status'] == 'error':
+                return QueryResponse(
+                    status="error",
+                    question=question,
+                    error_message=f"Failed to generate SQL query: {llm_response['message']}"
+                )
+            
+            return QueryResponse(
+                status="success",
+                question=question,
+                sql_query=self._ensure_limit(llm_response['sql_query'], limit),
+                query_type="llm_generated"
+            )
+            
+        except Exception as e:
+            logger.error(f"Error preparing query: {e}")
+            return QueryResponse(
+                status="error",
+                question=question,
+                error_message=f"Failed to prepare query: {str(e)}"
+            )
+    
     def _process_semantic_query(self, question: str, question_type: str, context: Dict) -> Optional[QueryResponse]:
         """Process query using semantic understanding"""
         try:
             # Generate SQL using semantic patterns
-            sql_query = self.semantic_service.generate_contextual_sql(question, question_type, context)
+            query = self.semantic_service.generate_contextual_query(question, question_type, context)
             
-            if not sql_query:
+            if not query:
                 return None
             
-            # Execute the query
-            query_result = db.execute_query(sql_query)
+            # Execute the parameterized query, report the equivalent literal SQL
+            sql_template, params = query
+            cache_key = ('semantic', question_type, sql_template, params)
+            cached = self._get_cached_response(cache_key, question)
+            if cached:
+                return cached
+            
+            # Trend lookups repeat per symbol and the data changes daily
+            query_result = get_db().execute_query(sql_template, params, cache=True)
+            sql_query = sql_template % params
             
             if query_result['status'] == 'error':
                 logger.warning(f"Semantic query failed: {query_result['message']}")
@@ -61,7 +250,7 @@ class EnhancedQueryProcessor:
                 question, results, question_type
             )
             
-            return QueryResponse(
+            response = QueryResponse(
                 status="success",
                 question=question,
                 sql_query=sql_query,
@@ -70,6 +259,8 @@ class EnhancedQueryProcessor:
                 row_count=row_count,
                 query_type=f"semantic_{question_type}"
             )
+            self._cache_response(cache_key, response)
+            return response
             
         except Exception as e:
             logger.error(f"Error in semantic query processing: {e}")
@@ -78,6 +269,11 @@ class EnhancedQueryProcessor:
     def _process_llm_query(self, question: str, table_info: Dict, limit: int) -> QueryResponse:
         """Process query using LLM-based approach"""
         try:
+            cache_key = ('llm', ' '.join(question.lower().split()), limit)
+            cached = self._get_cached_response(cache_key, question)
+            if cached:
+                return cached
+            
             # Generate SQL using LLM
             llm_response = self.llm_service.generate_sql_query(question, table_info)
             
@@ -88,14 +284,10 @@ class EnhancedQueryProcessor:
                     error_message=f"Failed to generate SQL query: {llm_response['message']}"
                 )
             
-            sql_query = llm_response['sql_query']
-            
-            # Add LIMIT clause if not present
-            if 'LIMIT' not in sql_query.upper():
-                sql_query += f" LIMIT {limit}"
+            sql_query = self._ensure_limit(llm_response['sql_query'], limit)
             
             # Execute the query
-            query_result = db.execute_query(sql_query)
+            query_result = get_db().execute_query(sql_query)
             
             if query_result['status'] == 'error':
                 return QueryResponse(
@@ -111,7 +303,61 @@ class EnhancedQueryProcessor:
             # Generate explanation using LLM
             explanation = self.llm_service.explain_results(question, results, sql_query)
             
+            response = QueryResponse(
+                status="success",
+                question=question,
+                sql_query=sql_query,
+                results=results,
+                explanation=explanation,
+                row_count=row_count,
+                query_type="llm_generated"
+            )
+            self._cache_response(cache_key, response)
+            return response
+            
+        except Exception as e:
+            logger.error(f"Error in LLM query processing: {e}")
             return QueryResponse(
+                status="error",
+                question=question,
+                error_message=f"Failed to process LLM query: {str(e)}"
+            )
+    
+    async def _aprocess_llm_query(self, question: str, table_info: Dict, limit: int) -> QueryResponse:
+        """Async variant of _process_llm_query"""
+        try:
+            cache_key = ('llm', ' '.join(question.lower().split()), limit)
+            cached = self._get_cached_response(cache_key, question)
+            if cached:
+                return cached
+            
+            llm_response = await self.llm_service.agenerate_sql_query(question, table_info)
+            
+            if llm_response['status'] == 'error':
+                return QueryResponse(
+                    status="error",
+                    question=question,
+                    error_message=f"Failed to generate SQL query: {llm_response['message']}"
+                )
+            
+            sql_query = self._ensure_limit(llm_response['sql_query'], limit)
+            
+            query_result = await get_async_db().execute_query(sql_query)
+            
+            if query_result['status'] == 'error':
+                return QueryResponse(
+                    status="error",
+                    question=question,
+                    sql_query=sql_query,
+                    error_message=f"Query execution failed: {query_result['message']}"
+                )
+            
+            results = query_result['data']
+            row_count = query_result['row_count']
+            
+            explanation = await self.llm_service.batch_explainer.submit(question, results, sql_query)
+            
+            response = QueryResponse(
                 status="success",
                 question=question,
                 sql_query=sql_query,
@@ -120,6 +366,8 @@ class EnhancedQueryProcessor:
                 row_count=row_count,
                 query_type="llm_generated"
             )
+            self._cache_response(cache_key, response)
+            return response
             
         except Exception as e:
             logger.error(f"Error in LLM query processing: {e}")
@@ -129,49 +377,39 @@ class EnhancedQueryProcessor:
                 error_message=f"Failed to process LLM query: {str(e)}"
             )
     
-    def get_field_meaning(self, field_name: str) -> Optional[Dict]:
+    def _ensure_limit(self, sql_query: str, limit: int) -> str:
+        """Add a LIMIT clause to LLM generated SQL if missing, rejecting anything but a single SELECT"""
+        try:
+            statements = [
+                statement for statement in sqlglot.parse(sql_query, dialect="mysql")
+                if statement is not None and not isinstance(statement, exp.Semicolon)
+            ]
+        except ParseError:
+            # SQL that cannot be checked never reaches the database
+            raise ValueError("Only a single SELECT query can be executed")
+        
+        if len(statements) != 1 or not isinstance(statements[0], (exp.Select, exp.Union)):
+            raise ValueError("Only a single SELECT query can be executed")
+        
+        parsed = statements[0]
+        # SELECT ... INTO writes to variables, tables or files
+        if parsed.find(exp.Into):
+            raise ValueError("Only a single SELECT query can be executed")
+        if parsed.args.get("limit"):
+            return sql_query
+        return parsed.limit(limit).sql(dialect="mysql") + ";"
+    
+    def get_field_meaning(self, field_name: str) -> Optional[Mapping[str, Any]]:
         """Get the semantic meaning of a database field"""
-        field_def = self.semantic_service.get_field_definition(field_name)
-        if field_def:
-            return {
-                'field_name': field_def.field_name,
-                'type': field_def.field_type.value,
-                'description': field_def.description,
-                'possible_values': field_def.possible_values,
-                'unit': field_def.unit,
-                'table': field_def.table
-            }
-        return None
+        return self.semantic_service.field_meanings.get(field_name)
     
-    def get_all_field_meanings(self) -> Dict[str, Dict]:
+    def get_all_field_meanings(self) -> Mapping[str, Mapping[str, Any]]:
         """Get semantic meanings for all database fields"""
-        meanings = {}
-        for field_name, field_def in self.semantic_service.field_definitions.items():
-            meanings[field_name] = {
-                'field_name': field_def.field_name,
-                'type': field_def.field_type.value,
-                'description': field_def.description,
-                'possible_values': field_def.possible_values,
-                'unit': field_def.unit,
-                'table': field_def.table
-            }
-        return meanings
+        return self.semantic_service.field_meanings
     
-    def suggest_questions(self) -> List[str]:
+    def suggest_questions(self) -> Tuple[str, ...]:
         """Suggest questions based on semantic understanding"""
-        suggestions = [
-            "What is the trend on symbol 230011 today?",
-            "When was the last time symbol 230011 moved from uptrend to downtrend?",
-            "Show me the trend history for symbol 230011 over the last 7 days",
-            "What stocks have high volume today?",
-            "Which stocks are in uptrend this week?",
-            "Show me stocks with downtrend in the last month",
-            "What is the current price of symbol 230011?",
-            "Which stocks have the highest trading volume?",
-            "Show me stock names and their current trends",
-            "What stocks changed trend recently?"
-        ]
-        return suggestions
+        return SEMANTIC_SUGGESTIONS
 
 # Global instance
 enhanced_query_processor = EnhancedQueryProcessor() 
\ No newline at end of file
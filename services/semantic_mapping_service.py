@@ -1,7 +1,10 @@
 import logging
-from typing import Dict, List, Optional, Any, Tuple
+from collections import Counter, defaultdict
+from typing import Dict, List, Mapping, Optional, Any, Sequence, Tuple
 from dataclasses import dataclass
 from enum import Enum
+from types import MappingProxyType
+from functools import lru_cache
 import re
 
 logger = logging.getLogger(__name__)
@@ -17,7 +20,7 @@ class FieldType(Enum):
     GRADE = "grade"
     NAME = "name"
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class FieldDefinition:
     """Definition of a database field with its semantic meaning"""
     field_name: str
@@ -36,9 +39,29 @@ class FieldDefinition:
 class SemanticMappingService:
     """Service for understanding the semantic meaning of database fields"""
     
+    # Look for patterns like "symbol 230011", "stock 230011", "230011"
+    _SYMBOL_PATTERNS = [
+        re.compile(r'symbol\s+(\d+)', re.IGNORECASE),
+        re.compile(r'stock\s+(\d+)', re.IGNORECASE),
+        re.compile(r'(\d{6,})'),  # 6+ digit numbers
+    ]
+    _DAYS_PATTERN = re.compile(r'(\d+)\s*days?', re.IGNORECASE)
+    # Every question pattern captures a number, questions without one are general
+    _DIGIT_PATTERN = re.compile(r'\d')
+    
     def __init__(self):
         self.field_definitions = self._initialize_field_definitions()
+        self.field_meanings = self._build_field_meanings()
+        self._fields_by_type = self._index_fields_by_type()
+        # Trend descriptions keyed by both the string and the integer value,
+        # since rows come back from the database with int trend codes
+        trend_values = self.field_definitions['TheTrendD'].possible_values
+        self._trend_descriptions = {**trend_values, **{int(k): v for k, v in trend_values.items()}}
         self.query_patterns = self._initialize_query_patterns()
+        self._question_re, self._question_groups = self._combine_query_patterns()
+        # Pure functions of the question, and the same suggested questions come back often
+        self.classify_question_type = lru_cache(maxsize=1024)(self.classify_question_type)
+        self.extract_symbol_from_question = lru_cache(maxsize=1024)(self.extract_symbol_from_question)
     
     def _initialize_field_definitions(self) -> Dict[str, FieldDefinition]:
         """Initialize field definitions with semantic meanings"""
@@ -170,9 +193,30 @@ class SemanticMappingService:
             ),
         }
     
+    def _build_field_meanings(self) -> Mapping[str, Mapping[str, Any]]:
+        """Read-only view of every field definition as served by the API"""
+        return MappingProxyType({
+            field_name: MappingProxyType({
+                'field_name': field_def.field_name,
+                'type': field_def.field_type.value,
+                'description': field_def.description,
+                'possible_values': field_def.possible_values,
+                'unit': field_def.unit,
+                'table': field_def.table
+            })
+            for field_name, field_def in self.field_definitions.items()
+        })
+    
+    def _index_fields_by_type(self) -> Dict[FieldType, Tuple[FieldDefinition, ...]]:
+        """Group the field definitions by their field type"""
+        fields_by_type = defaultdict(list)
+        for field_def in self.field_definitions.values():
+            fields_by_type[field_def.field_type].append(field_def)
+        return {field_type: tuple(fields) for field_type, fields in fields_by_type.items()}
+    
     def _initialize_query_patterns(self) -> Dict[str, List[Dict]]:
         """Initialize patterns for recognizing different types of queries"""
-        return {
+        query_patterns = {
             'trend_current': [
                 {
                     'patterns': [
@@ -187,10 +231,11 @@ class SemanticMappingService:
                                n.HebName, n.EngName
                         FROM stock_data s
                         LEFT JOIN name_index n ON s.Nrnum = n.Nrnum
-                        WHERE s.Nrnum = {symbol}
+                        WHERE s.Nrnum = %s
                         ORDER BY s.Date DESC
                         LIMIT 1
-                    """
+                    """,
+                    'params': ('symbol',)
                 }
             ],
             'trend_change': [
@@ -201,19 +246,24 @@ class SemanticMappingService:
                         r'when.*(\d+).*moved.*up.*down',
                         r'trend.*change.*(\d+)'
                     ],
+                    # LAG() compares each day with the previous one on the server,
+                    # so only the days the trend flipped are sent back
                     'sql_template': """
-                        SELECT s1.Nrnum, s1.Date, s1.TheTrendD as from_trend, 
-                               s2.TheTrendD as to_trend, s1.Price, s1.UpsDowns,
+                        SELECT c.Nrnum, c.Date, c.prev_trend as from_trend,
+                               c.TheTrendD as to_trend, c.Price, c.UpsDowns,
                                n.HebName, n.EngName
-                        FROM stock_data s1
-                        JOIN stock_data s2 ON s1.Nrnum = s2.Nrnum 
-                            AND s1.Date < s2.Date
-                        LEFT JOIN name_index n ON s1.Nrnum = n.Nrnum
-                        WHERE s1.Nrnum = {symbol}
-                            AND s1.TheTrendD = 1 AND s2.TheTrendD = 2
-                        ORDER BY s1.Date DESC
+                        FROM (
+                            SELECT Nrnum, Date, TheTrendD, Price, UpsDowns,
+                                   LAG(TheTrendD) OVER (ORDER BY Date) as prev_trend
+                            FROM stock_data
+                            WHERE Nrnum = %s
+                        ) c
+                        LEFT JOIN name_index n ON c.Nrnum = n.Nrnum
+                        WHERE c.prev_trend = 1 AND c.TheTrendD = 2
+                        ORDER BY c.Date DESC
                         LIMIT 10
-                    """
+                    """,
+                    'params': ('symbol',)
                 }
             ],
             'trend_history': [
@@ -228,33 +278,57 @@ class SemanticMappingService:
                                n.HebName, n.EngName
                         FROM stock_data s
                         LEFT JOIN name_index n ON s.Nrnum = n.Nrnum
-                        WHERE s.Nrnum = {symbol}
+                        WHERE s.Nrnum = %s
                         ORDER BY s.Date DESC
-                        LIMIT {days}
-                    """
+                        LIMIT %s
+                    """,
+                    'params': ('symbol', 'days')
                 }
             ]
         }
+        
+        # Compile once, classify_question_type runs them for every question
+        for patterns_list in query_patterns.values():
+            for pattern_info in patterns_list:
+                pattern_info['patterns'] = [re.compile(p, re.IGNORECASE) for p in pattern_info['patterns']]
+        
+        return query_patterns
+    
+    def _combine_query_patterns(self) -> Tuple[re.Pattern, Dict[str, Tuple]]:
+        """Union all question patterns into one regex with a named group per pattern
+        
+        Each alternative is a lazy prefix plus the pattern, anchored at the
+        start, so alternatives are tried in declaration order just like
+        running the patterns one after another.
+        """
+        alternatives = []
+        groups = {}
+        for query_type, patterns_list in self.query_patterns.items():
+            for pattern_info in patterns_list:
+                for pattern in pattern_info['patterns']:
+                    name = f"{query_type}__{len(groups)}"
+                    alternatives.append(f"(?s:.*?)(?P<{name}>{pattern.pattern})")
+                    groups[name] = (query_type, pattern_info, pattern)
+        
+        question_re = re.compile('^(?:' + '|'.join(alternatives) + ')', re.IGNORECASE)
+        return question_re, groups
     
     def get_field_definition(self, field_name: str) -> Optional[FieldDefinition]:
         """Get the semantic definition of a field"""
         return self.field_definitions.get(field_name)
     
-    def get_field_by_type(self, field_type: FieldType) -> List[FieldDefinition]:
+    def get_field_definitions(self, field_names: Sequence[str]) -> Dict[str, Optional[FieldDefinition]]:
+        """Get the semantic definitions of several fields, None for unknown ones"""
+        return {field_name: self.field_definitions.get(field_name) for field_name in field_names}
+    
+    def get_field_by_type(self, field_type: FieldType) -> Tuple[FieldDefinition, ...]:
         """Get all fields of a specific type"""
-        return [fd for fd in self.field_definitions.values() if fd.field_type == field_type]
+        return self._fields_by_type.get(field_type, ())
     
     def extract_symbol_from_question(self, question: str) -> Optional[str]:
         """Extract stock symbol from a natural language question"""
-        # Look for patterns like "symbol 230011", "stock 230011", "230011"
-        patterns = [
-            r'symbol\s+(\d+)',
-            r'stock\s+(\d+)',
-            r'(\d{6,})',  # 6+ digit numbers
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, question, re.IGNORECASE)
+        for pattern in self._SYMBOL_PATTERNS:
+            match = pattern.search(question)
             if match:
                 return match.group(1)
         
@@ -262,53 +336,85 @@ class SemanticMappingService:
     
     def classify_question_type(self, question: str) -> Tuple[str, Dict]:
         """Classify the type of question being asked"""
-        question_lower = question.lower()
+        if not self._DIGIT_PATTERN.search(question):
+            return 'general', {}
         
-        for query_type, patterns_list in self.query_patterns.items():
-            for pattern_info in patterns_list:
-                for pattern in pattern_info['patterns']:
-                    match = re.search(pattern, question_lower)
-                    if match:
-                        return query_type, {
-                            'pattern': pattern,
-                            'sql_template': pattern_info['sql_template'],
-                            'matches': match.groups()
-                        }
+        match = self._question_re.match(question)
+        if not match:
+            return 'general', {}
         
-        return 'general', {}
+        # The named group encloses the pattern's own groups, so it closes last
+        query_type, pattern_info, pattern = self._question_groups[match.lastgroup]
+        start = self._question_re.groupindex[match.lastgroup]
+        return query_type, {
+            'pattern': pattern.pattern,
+            'sql_template': pattern_info['sql_template'],
+            'params': pattern_info['params'],
+            'matches': match.groups()[start:start + pattern.groups]
+        }
     
-    def generate_contextual_sql(self, question: str, question_type: str, context: Dict) -> str:
-        """Generate SQL query based on question type and context"""
-        if question_type == 'trend_current':
-            symbol = self.extract_symbol_from_question(question)
-            if symbol:
-                return context['sql_template'].format(symbol=symbol)
+    def generate_contextual_query(self, question: str, question_type: str, context: Dict) -> Optional[Tuple[str, Tuple]]:
+        """Generate a parameterized SQL query (%s placeholders) and its parameters
         
-        elif question_type == 'trend_change':
-            symbol = self.extract_symbol_from_question(question)
-            if symbol:
-                return context['sql_template'].format(symbol=symbol)
-        
-        elif question_type == 'trend_history':
-            symbol = self.extract_symbol_from_question(question)
-            days = 7  # Default to 7 days
-            # Extract number of days if mentioned
-            days_match = re.search(r'(\d+).*days?', question.lower())
-            if days_match:
-                days = int(days_match.group(1))
-            
-            if symbol:
-                return context['sql_template'].format(symbol=symbol, days=days)
+        The SQL text only depends on the question type, so the database can
+        reuse one prepared statement for every symbol.
+        """
+        # The pattern captures are not reliable symbols (greedy ".*(\d+)" keeps
+        # only the last digit), so extract once here with the symbol rules
+        symbol = self.extract_symbol_from_question(question)
         
         # Fallback to general query
-        return None
+        if question_type not in self.query_patterns or not symbol:
+            return None
+        
+        values = {'symbol': int(symbol)}
+        if 'days' in context['params']:
+            # Extract number of days if mentioned, default to 7 days
+            days_match = self._DAYS_PATTERN.search(question)
+            values['days'] = int(days_match.group(1)) if days_match else 7
+        
+        return context['sql_template'], tuple(values[name] for name in context['params'])
+    
+    def generate_contextual_sql(self, question: str, question_type: str, context: Dict) -> str:
+        """Generate SQL query based on question type and context"""
+        query = self.generate_contextual_query(question, question_type, context)
+        if not query:
+            return None
+        
+        # Parameters are integers, inlining them gives the equivalent literal SQL
+        sql_template, params = query
+        return sql_template % params
+    
+    def generate_current_trends_query(self, symbols: List[str]) -> Tuple[str, Tuple]:
+        """Generate one parameterized query returning the latest row for each symbol"""
+        placeholders = ', '.join(['%s'] * len(symbols))
+        sql_query = f"""
+            SELECT s.Nrnum, s.Date, s.TheTrendD, s.Price, s.UpsDowns,
+                   n.HebName, n.EngName
+            FROM stock_data s
+            JOIN (
+                SELECT Nrnum, MAX(Date) as Date
+                FROM stock_data
+                WHERE Nrnum IN ({placeholders})
+                GROUP BY Nrnum
+            ) latest ON s.Nrnum = latest.Nrnum AND s.Date = latest.Date
+            LEFT JOIN name_index n ON s.Nrnum = n.Nrnum
+        """
+        return sql_query, tuple(int(symbol) for symbol in symbols)
     
     def interpret_trend_value(self, value: Any) -> str:
         """Convert numeric trend value to human-readable description"""
-        trend_def = self.field_definitions.get('TheTrendD')
-        if trend_def and trend_def.possible_values:
-            return trend_def.possible_values.get(str(value), f"Unknown trend value: {value}")
-        return str(value)
+        try:
+            return self._trend_descriptions[value]
+        except (KeyError, TypeError):
+            return f"Unknown trend value: {value}"
+    
+    def _describe_trend_change(self, result: Dict) -> str:
+        """Describe a single trend change row"""
+        stock_name = result.get('EngName') or result.get('HebName') or f"Stock {result.get('Nrnum', 'Unknown')}"
+        from_trend = self.interpret_trend_value(result.get('from_trend'))
+        to_trend = self.interpret_trend_value(result.get('to_trend'))
+        return f"{stock_name} changed from {from_trend} to {to_trend} on {result.get('Date')}"
     
     def generate_natural_response(self, question: str, results: List[Dict], question_type: str) -> str:
         """Generate natural language response based on results and question type"""
@@ -330,26 +436,16 @@ class SemanticMappingService:
             if len(results) == 0:
                 return "No trend changes found for the specified criteria."
             
-            changes = []
-            for result in results[:5]:  # Limit to 5 most recent changes
-                symbol = result.get('Nrnum', 'Unknown')
-                stock_name = result.get('EngName') or result.get('HebName') or f"Stock {symbol}"
-                date = result.get('Date')
-                from_trend = self.interpret_trend_value(result.get('from_trend'))
-                to_trend = self.interpret_trend_value(result.get('to_trend'))
-                
-                changes.append(f"{stock_name} changed from {from_trend} to {to_trend} on {date}")
+            # Limit to 5 most recent changes
+            changes = '; '.join(map(self._describe_trend_change, results[:5]))
             
-            return f"Found {len(results)} trend changes. Recent changes: {'; '.join(changes)}."
+            return f"Found {len(results)} trend changes. Recent changes: {changes}."
         
         elif question_type == 'trend_history':
             symbol = results[0].get('Nrnum', 'Unknown')
             stock_name = results[0].get('EngName') or results[0].get('HebName') or f"Stock {symbol}"
             
-            trend_summary = {}
-            for result in results:
-                trend = self.interpret_trend_value(result.get('TheTrendD'))
-                trend_summary[trend] = trend_summary.get(trend, 0) + 1
+            trend_summary = Counter(self.interpret_trend_value(result.get('TheTrendD')) for result in results)
             
             summary_parts = [f"{count} days of {trend}" for trend, count in trend_summary.items()]
             
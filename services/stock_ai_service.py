@@ -1,41 +1,68 @@
+import asyncio
 import logging
-from typing import Dict, List, Optional
-from database.connection import db
-from ai.llm_service import llm_service
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Sequence, Tuple
+from database.connection import get_async_db, get_db
+from ai.llm_service import get_llm_service
 from services.enhanced_query_processor import enhanced_query_processor
-from models.schemas import QueryResponse, QuestionSuggestionResponse
+from services.semantic_mapping_service import semantic_mapping_service
+from config import config
+from models.schemas import BatchQueryResponse, QueryResponse, QuestionSuggestionResponse, TrendBatchResponse
 
 logger = logging.getLogger(__name__)
 
 class StockAIService:
     def __init__(self):
+        # Loaded on first use rather than at import time
         self.table_info = None
-        self._load_table_info()
+        # When table info should be loaded again; pushed out a few seconds after
+        # a failure so that requests do not hammer a database that is down
+        self._table_info_expiry = 0.0
+    
+    def _table_info_expired(self) -> bool:
+        """Whether table info is missing or due for a refresh"""
+        return time.monotonic() >= self._table_info_expiry
     
     def _load_table_info(self):
         """Load database table information"""
+        if not self._table_info_expired():
+            return
+        
         try:
-            db_status = db.test_connection()
+            db_status = get_db().test_connection()
             if db_status['status'] == 'connected':
                 self.table_info = db_status['tables']
+                self._table_info_expiry = time.monotonic() + config.SCHEMA_CACHE_TTL
                 logger.info(f"Loaded table info for {len(self.table_info)} tables")
-            else:
-                logger.error(f"Failed to load table info: {db_status.get('message', 'Unknown error')}")
+                return
+            logger.error(f"Failed to load table info: {db_status.get('message', 'Unknown error')}")
         except Exception as e:
             logger.error(f"Error loading table info: {e}")
+        
+        self._table_info_expiry = time.monotonic() + config.SCHEMA_RETRY_DELAY
+    
+    def warm_schema_prompt(self, tables: Dict):
+        """Adopt table info loaded at startup and render its schema prompt ahead of the first question"""
+        self.table_info = tables
+        self._table_info_expiry = time.monotonic() + config.SCHEMA_CACHE_TTL
+        try:
+            get_llm_service().warm_schema_prompt(tables)
+        except Exception as e:
+            logger.error(f"Error warming schema prompt: {e}")
     
     def process_question(self, question: str, limit: int = 100) -> QueryResponse:
         """Process a natural language question and return results"""
         try:
             # Check if we have table info
-            if not self.table_info:
+            if self._table_info_expired():
                 self._load_table_info()
-                if not self.table_info:
-                    return QueryResponse(
-                        status="error",
-                        question=question,
-                        error_message="Database connection not available"
-                    )
+            if not self.table_info:
+                return QueryResponse(
+                    status="error",
+                    question=question,
+                    error_message="Database connection not available"
+                )
             
             # Use enhanced query processor with semantic understanding
             result = enhanced_query_processor.process_question(question, self.table_info, limit)
@@ -50,28 +77,141 @@ class StockAIService:
                 error_message=f"Unexpected error: {str(e)}"
             )
     
-    def get_question_suggestions(self) -> QuestionSuggestionResponse:
-        """Get suggested questions based on semantic understanding"""
+    def process_questions(self, questions: Sequence[str], limit: int = 100) -> List[QueryResponse]:
+        """Process several questions concurrently, returning the results in the same order"""
+        if not questions:
+            return []
+        
+        # Each question mostly waits on the LLM and the database, so overlap
+        # them, but with no more workers than there are pooled connections
+        workers = min(len(questions), config.OPENAI_MAX_CONCURRENCY, get_db().pool_size())
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda question: self.process_question(question, limit), questions))
+    
+    async def _aensure_table_info(self) -> bool:
+        """Load table info off the event loop if needed, returns whether it is available"""
+        if self._table_info_expired():
+            await asyncio.to_thread(self._load_table_info)
+        return bool(self.table_info)
+    
+    async def aprocess_question(self, question: str, limit: int = 100) -> QueryResponse:
+        """Async variant of process_question for use from the API event loop"""
         try:
-            suggestions = enhanced_query_processor.suggest_questions()
+            if not await self._aensure_table_info():
+                return QueryResponse(
+                    status="error",
+                    question=question,
+                    error_message="Database connection not available"
+                )
             
-            return QuestionSuggestionResponse(
+            return await enhanced_query_processor.aprocess_question(question, self.table_info, limit)
+            
+        except Exception as e:
+            logger.error(f"Error processing question: {e}")
+            return QueryResponse(
+                status="error",
+                question=question,
+                error_message=f"Unexpected error: {str(e)}"
+            )
+    
+    async def astream_question(self, question: str, limit: int = 100) -> AsyncIterator[Tuple[str, Any]]:
+        """Process a question and stream the result followed by explanation tokens"""
+        if not await self._aensure_table_info():
+            yield 'result', QueryResponse(
+                status="error",
+                question=question,
+                error_message="Database connection not available"
+            )
+            return
+        
+        async for event in enhanced_query_processor.astream_question(question, self.table_info, limit):
+            yield event
+    
+    async def aprepare_query(self, question: str, limit: int = 100) -> QueryResponse:
+        """Generate the SQL for a question without executing it"""
+        if not await self._aensure_table_info():
+            return QueryResponse(
+                status="error",
+                question=question,
+                error_message="Database connection not available"
+            )
+        
+        return await enhanced_query_processor.aprepare_query(question, self.table_info, limit)
+    
+    async def submit_question_batch(self, questions: List[str]) -> BatchQueryResponse:
+        """Submit many questions for offline SQL generation via the OpenAI Batch API"""
+        if not await self._aensure_table_info():
+            return BatchQueryResponse(
+                status="error",
+                error_message="Database connection not available"
+            )
+        
+        result = await get_llm_service().submit_batch(questions, self.table_info)
+        if result['status'] == 'error':
+            return BatchQueryResponse(
+                status="error",
+                error_message=f"Failed to submit batch: {result['message']}"
+            )
+        return BatchQueryResponse(**result)
+    
+    async def get_question_batch(self, batch_id: str) -> BatchQueryResponse:
+        """Get the status and generated SQL of a submitted question batch"""
+        result = await get_llm_service().get_batch_results(batch_id)
+        if result['status'] == 'error':
+            return BatchQueryResponse(
+                status="error",
+                batch_id=batch_id,
+                error_message=f"Failed to retrieve batch: {result['message']}"
+            )
+        return BatchQueryResponse(**result)
+    
+    def get_current_trends(self, symbols: List[str], connection=None) -> TrendBatchResponse:
+        """Get the latest trend for many symbols with a single database query"""
+        try:
+            # Duplicates would only repeat the same placeholder
+            symbols = list(dict.fromkeys(symbols))
+            sql_query, params = semantic_mapping_service.generate_current_trends_query(symbols)
+            query_result = get_db().execute_query(sql_query, params, connection=connection, cache=True)
+            
+            if query_result['status'] == 'error':
+                return TrendBatchResponse(
+                    status="error",
+                    error_message=f"Query execution failed: {query_result['message']}"
+                )
+            
+            trends = [
+                {**row, 'trend_description': semantic_mapping_service.interpret_trend_value(row.get('TheTrendD'))}
+                for row in query_result['data']
+            ]
+            return TrendBatchResponse(
                 status="success",
-                suggestions=suggestions
+                trends=trends,
+                row_count=len(trends)
             )
             
         except Exception as e:
-            logger.error(f"Error getting question suggestions: {e}")
-            return QuestionSuggestionResponse(
+            logger.error(f"Error getting current trends: {e}")
+            return TrendBatchResponse(
                 status="error",
-                suggestions=[],
-                error_message=f"Failed to generate suggestions: {str(e)}"
+                error_message=f"Failed to get current trends: {str(e)}"
             )
     
+    def get_question_suggestions(self) -> QuestionSuggestionResponse:
+        """Get suggested questions based on semantic understanding"""
+        return QuestionSuggestionResponse(
+            status="success",
+            suggestions=enhanced_query_processor.suggest_questions()
+        )
+    
+    def clear_cache(self):
+        """Forget cached answers so the next questions hit the LLM and database again"""
+        enhanced_query_processor.clear_response_cache()
+        get_db().clear_result_cache()
+    
     def get_database_status(self) -> Dict:
         """Get current database status and table information"""
         try:
-            return db.test_connection()
+            return get_db().test_connection()
         except Exception as e:
             logger.error(f"Error getting database status: {e}")
             return {
@@ -79,29 +219,29 @@ class StockAIService:
                 'message': str(e)
             }
     
+    async def acheck_database(self) -> bool:
+        """Check database liveness without schema introspection"""
+        try:
+            return await get_async_db().ping()
+        except Exception as e:
+            logger.error(f"Error checking database: {e}")
+            return False
+    
     def test_llm_connection(self) -> bool:
         """Test if LLM service is available"""
         try:
-            return llm_service.llm is not None
+            return get_llm_service().llm is not None
         except Exception as e:
             logger.error(f"Error testing LLM connection: {e}")
             return False
     
-    def get_field_meanings(self) -> Dict[str, Dict]:
+    def get_field_meanings(self) -> Mapping[str, Mapping[str, Any]]:
         """Get semantic meanings of all database fields"""
-        try:
-            return enhanced_query_processor.get_all_field_meanings()
-        except Exception as e:
-            logger.error(f"Error getting field meanings: {e}")
-            return {}
+        return enhanced_query_processor.get_all_field_meanings()
     
-    def get_field_meaning(self, field_name: str) -> Optional[Dict]:
+    def get_field_meaning(self, field_name: str) -> Optional[Mapping[str, Any]]:
         """Get semantic meaning of a specific database field"""
-        try:
-            return enhanced_query_processor.get_field_meaning(field_name)
-        except Exception as e:
-            logger.error(f"Error getting field meaning for {field_name}: {e}")
-            return None
+        return enhanced_query_processor.get_field_meaning(field_name)
 
 # Global service instance
 stock_ai_service = StockAIService() 
\ No newline at end of file
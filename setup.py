@@ -44,12 +44,12 @@ def check_dependencies():
 
 def check_python_version():
     """Check Python version"""
-    if sys.version_info >= (3, 8):
+    if sys.version_info >= (3, 10):
         print(f"✓ Python version {sys.version_info.major}.{sys.version_info.minor} is compatible")
         return True
     else:
         print(f"✗ Python version {sys.version_info.major}.{sys.version_info.minor} is too old")
-        print("  Python 3.8+ is required")
+        print("  Python 3.10+ is required")
         return False
 
 def main():
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+"""
+Shared helpers for the manual test scripts
+"""
+
+import sys
+
+def run_tests(*tests):
+    """Run the tests, writing each test's report to the terminal in one burst"""
+    # Line buffering would issue a write for every printed line
+    sys.stdout.reconfigure(line_buffering=False)
+    for test in tests:
+        try:
+            test()
+        finally:
+            sys.stdout.flush()
@@ -7,8 +7,36 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from services.stock_ai_service import stock_ai_service
+# The full LLM and database stack is imported only by the tests that use it
 from services.semantic_mapping_service import semantic_mapping_service
+from test_helpers import run_tests
+
+FIELD_NAMES = ('TheTrendD', 'Price', 'UpsDowns', 'Nrnum', 'Date')
+TREND_VALUES = (0, 1, 2)
+
+CLASSIFICATION_QUESTIONS = (
+    "What is the trend on symbol 230011 today?",
+    "When was the last time symbol 230011 moved from uptrend to downtrend?",
+    "Show me the trend history for symbol 230011 over the last 7 days",
+    "What stocks have high volume?",
+    "Show me stocks with uptrend in the last week",
+    "What is the average price for stock 230011?"
+)
+
+SYMBOL_QUESTIONS = (
+    "What is the trend on symbol 230011 today?",
+    "When was the last time stock 230011 changed from long to short?",
+    "Show me the trend history for 230011 over the last 7 days",
+    "What is the price of 230011?",
+    "How is 230011 trending today?"
+)
+
+# Questions that should be handled by semantic patterns
+TREND_QUESTIONS = (
+    "What is the trend on symbol 230011 today?",
+    "When was the last time symbol 230011 moved from uptrend to downtrend?",
+    "Show me the trend history for symbol 230011 over the last 7 days"
+)
 
 def test_semantic_field_understanding():
     """Test the semantic understanding of database fields"""
@@ -16,10 +44,8 @@ def test_semantic_field_understanding():
     print("=== Semantic Field Understanding Test ===\n")
     
     # Test field definitions
-    test_fields = ['TheTrendD', 'Price', 'UpsDowns', 'Nrnum', 'Date']
-    
-    for field_name in test_fields:
-        field_def = semantic_mapping_service.get_field_definition(field_name)
+    field_defs = semantic_mapping_service.get_field_definitions(FIELD_NAMES)
+    for field_name, field_def in field_defs.items():
         if field_def:
             print(f"✓ {field_name}: {field_def.description}")
             if field_def.possible_values:
@@ -32,8 +58,7 @@ def test_semantic_field_understanding():
     
     # Test trend value interpretation
     print("=== Trend Value Interpretation Test ===\n")
-    trend_values = [0, 1, 2]
-    for value in trend_values:
+    for value in TREND_VALUES:
         interpretation = semantic_mapping_service.interpret_trend_value(value)
         print(f"✓ Trend value {value} = {interpretation}")
     print()
@@ -43,16 +68,7 @@ def test_query_classification():
     
     print("=== Query Classification Test ===\n")
     
-    test_questions = [
-        "What is the trend on symbol 230011 today?",
-        "When was the last time symbol 230011 moved from uptrend to downtrend?",
-        "Show me the trend history for symbol 230011 over the last 7 days",
-        "What stocks have high volume?",
-        "Show me stocks with uptrend in the last week",
-        "What is the average price for stock 230011?"
-    ]
-    
-    for question in test_questions:
+    for question in CLASSIFICATION_QUESTIONS:
         question_type, context = semantic_mapping_service.classify_question_type(question)
         print(f"Question: {question}")
         print(f"  Classified as: {question_type}")
@@ -65,15 +81,7 @@ def test_symbol_extraction():
     
     print("=== Symbol Extraction Test ===\n")
     
-    test_questions = [
-        "What is the trend on symbol 230011 today?",
-        "When was the last time stock 230011 changed from long to short?",
-        "Show me the trend history for 230011 over the last 7 days",
-        "What is the price of 230011?",
-        "How is 230011 trending today?"
-    ]
-    
-    for question in test_questions:
+    for question in SYMBOL_QUESTIONS:
         symbol = semantic_mapping_service.extract_symbol_from_question(question)
         print(f"Question: {question}")
         print(f"  Extracted symbol: {symbol}")
@@ -81,20 +89,14 @@ def test_symbol_extraction():
 
 def test_semantic_queries():
     """Test semantic-based query processing"""
+    from services.stock_ai_service import stock_ai_service
     
     print("=== Semantic Query Processing Test ===\n")
     
-    # Test questions that should be handled by semantic patterns
-    semantic_questions = [
-        "What is the trend on symbol 230011 today?",
-        "When was the last time symbol 230011 moved from uptrend to downtrend?",
-        "Show me the trend history for symbol 230011 over the last 7 days"
-    ]
-    
-    for question in semantic_questions:
+    results = stock_ai_service.process_questions(TREND_QUESTIONS)
+    for question, result in zip(TREND_QUESTIONS, results):
         print(f"Question: {question}")
         try:
-            result = stock_ai_service.process_question(question)
             if result.status == "success":
                 print(f"  ✓ Success: {result.query_type}")
                 print(f"  ✓ SQL: {result.sql_query[:100]}...")
@@ -108,6 +110,7 @@ def test_semantic_queries():
 
 def test_field_meanings_api():
     """Test the field meanings API functionality"""
+    from services.stock_ai_service import stock_ai_service
     
     print("=== Field Meanings API Test ===\n")
     
@@ -117,8 +120,7 @@ def test_field_meanings_api():
         print(f"✓ Retrieved {len(meanings)} field meanings")
         
         # Test specific field meanings
-        test_fields = ['TheTrendD', 'Price', 'UpsDowns']
-        for field in test_fields:
+        for field in FIELD_NAMES[:3]:
             meaning = stock_ai_service.get_field_meaning(field)
             if meaning:
                 print(f"✓ {field}: {meaning['description']}")
@@ -132,35 +134,24 @@ def test_field_meanings_api():
 
 def test_trend_understanding():
     """Test specific trend understanding capabilities"""
+    from services.stock_ai_service import stock_ai_service
     
     print("=== Trend Understanding Test ===\n")
     
     # Test trend value meanings
-    trend_values = {
-        0: "sideways (no clear trend)",
-        1: "uptrend (long position)", 
-        2: "downtrend (short position)"
-    }
-    
     print("Trend value meanings:")
-    for value, meaning in trend_values.items():
+    for value in TREND_VALUES:
         interpreted = semantic_mapping_service.interpret_trend_value(value)
         print(f"  {value} = {interpreted}")
     
     print()
     
     # Test trend-related questions
-    trend_questions = [
-        "What is the trend on symbol 230011 today?",
-        "When was the last time symbol 230011 moved from uptrend to downtrend?",
-        "Show me the trend history for symbol 230011 over the last 7 days"
-    ]
-    
     print("Testing trend-related questions:")
-    for question in trend_questions:
+    results = stock_ai_service.process_questions(TREND_QUESTIONS)
+    for question, result in zip(TREND_QUESTIONS, results):
         print(f"\nQuestion: {question}")
         try:
-            result = stock_ai_service.process_question(question)
             if result.status == "success":
                 print(f"  ✓ Success")
                 print(f"  ✓ Query type: {result.query_type}")
@@ -172,6 +163,7 @@ def test_trend_understanding():
 
 def test_database_connection():
     """Test database connection and schema"""
+    from services.stock_ai_service import stock_ai_service
     
     print("=== Database Connection Test ===\n")
     
@@ -183,15 +175,14 @@ def test_database_connection():
             print(f"✓ Tables: {list(status['tables'].keys())}")
             
             # Check for required fields
-            required_fields = ['TheTrendD', 'Price', 'UpsDowns', 'Nrnum', 'Date']
-            for table_name, columns in status['tables'].items():
-                if table_name == 'stock_data':
-                    field_names = [col['field'] for col in columns]
-                    for field in required_fields:
-                        if field in field_names:
-                            print(f"✓ Found required field: {field}")
-                        else:
-                            print(f"✗ Missing required field: {field}")
+            columns = status['tables'].get('stock_data')
+            if columns is not None:
+                missing = set(FIELD_NAMES).difference(col['field'] for col in columns)
+                for field in FIELD_NAMES:
+                    if field in missing:
+                        print(f"✗ Missing required field: {field}")
+                    else:
+                        print(f"✓ Found required field: {field}")
         else:
             print(f"✗ Database error: {status.get('message', 'Unknown error')}")
     except Exception as e:
@@ -204,13 +195,15 @@ if __name__ == "__main__":
         print("🧠 Testing Semantic Understanding System\n")
         print("=" * 50)
         
-        test_database_connection()
-        test_semantic_field_understanding()
-        test_query_classification()
-        test_symbol_extraction()
-        test_field_meanings_api()
-        test_trend_understanding()
-        test_semantic_queries()
+        run_tests(
+            test_database_connection,
+            test_semantic_field_understanding,
+            test_query_classification,
+            test_symbol_extraction,
+            test_field_meanings_api,
+            test_trend_understanding,
+            test_semantic_queries
+        )
         
         print("\n" + "=" * 50)
         print("✅ Semantic Understanding Test Completed")
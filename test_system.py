@@ -6,6 +6,7 @@ Test script for Stock AI Analysis System
 import asyncio
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # Configure logging
@@ -28,8 +29,8 @@ def test_config():
 def test_database_connection():
     """Test database connection"""
     try:
-        from database.connection import db
-        status = db.test_connection()
+        from database.connection import get_db
+        status = get_db().test_connection()
         
         if status['status'] == 'connected':
             logger.info("✓ Database connection successful")
@@ -43,11 +44,34 @@ def test_database_connection():
         logger.error(f"✗ Database connection error: {e}")
         return False
 
+def test_async_literal_percent():
+    """Test that async queries without parameters keep literal % signs"""
+    try:
+        from database.connection import AsyncDatabaseConnection
+        
+        async def run():
+            db = AsyncDatabaseConnection()
+            try:
+                return await db.execute_query("SELECT 'bank' LIKE '%an%' AS matched")
+            finally:
+                await db.close()
+        
+        result = asyncio.run(run())
+        if result['status'] == 'success' and result['data'][0]['matched']:
+            logger.info("✓ Async query with LIKE '%an%' succeeded")
+            return True
+        else:
+            logger.error(f"✗ Async query with literal % failed: {result.get('message', result)}")
+            return False
+    except Exception as e:
+        logger.error(f"✗ Async query error: {e}")
+        return False
+
 def test_llm_service():
     """Test LLM service"""
     try:
-        from ai.llm_service import llm_service
-        if llm_service.llm is not None:
+        from ai.llm_service import get_llm_service
+        if get_llm_service().llm is not None:
             logger.info("✓ LLM service initialized successfully")
             return True
         else:
@@ -57,6 +81,38 @@ def test_llm_service():
         logger.error(f"✗ LLM service error: {e}")
         return False
 
+def test_sql_cache_templating():
+    """Test that cached SQL is re-used with the right stock numbers"""
+    try:
+        from ai.llm_service import get_llm_service
+        llm_service = get_llm_service()
+        table_info = {'stock_data': [{'field': 'Nrnum', 'type': 'int', 'null': 'NO', 'key': 'PRI'}]}
+        
+        # One number is a prefix of the other, so the pair must not be templated
+        llm_service._cache_sql(
+            "compare 230011 with 2300112", table_info,
+            "SELECT * FROM stock_data WHERE Nrnum IN (230011, 2300112) LIMIT 100;"
+        )
+        cached = llm_service._get_cached_sql("compare 555555 with 6666666", table_info)
+        if cached is not None:
+            logger.error(f"✗ Overlapping stock numbers were templated: {cached}")
+            return False
+        
+        llm_service._cache_sql(
+            "compare 230011 with 1230012", table_info,
+            "SELECT * FROM stock_data WHERE Nrnum IN (230011, 1230012) LIMIT 100;"
+        )
+        cached = llm_service._get_cached_sql("compare 555555 with 6666666", table_info)
+        if cached != "SELECT * FROM stock_data WHERE Nrnum IN (555555, 6666666) LIMIT 100;":
+            logger.error(f"✗ Cached SQL has the wrong stock numbers: {cached}")
+            return False
+        
+        logger.info("✓ SQL cache substitutes stock numbers correctly")
+        return True
+    except Exception as e:
+        logger.error(f"✗ SQL cache error: {e}")
+        return False
+
 def test_stock_ai_service():
     """Test stock AI service"""
     try:
@@ -96,23 +152,39 @@ def main():
     logger.info("Stock AI Analysis System - System Test")
     logger.info("=" * 50)
     
+    # (name, test, prerequisites), listed after their prerequisites
     tests = [
-        ("Configuration", test_config),
-        ("Database Connection", test_database_connection),
-        ("LLM Service", test_llm_service),
-        ("Stock AI Service", test_stock_ai_service),
-        ("API Imports", test_api_imports),
+        ("Configuration", test_config, []),
+        ("Database Connection", test_database_connection, ["Configuration"]),
+        ("Async Literal %", test_async_literal_percent, ["Database Connection"]),
+        ("LLM Service", test_llm_service, ["Configuration"]),
+        ("SQL Cache Templating", test_sql_cache_templating, ["LLM Service"]),
+        ("Stock AI Service", test_stock_ai_service, ["Database Connection", "LLM Service"]),
+        ("API Imports", test_api_imports, ["Configuration"]),
     ]
     
-    results = []
-    for test_name, test_func in tests:
+    futures = {}
+    
+    def run_test(test_name, test_func, prerequisites):
+        # A test is pointless (and slow to time out) when what it builds on failed
+        failed = [name for name in prerequisites if not futures[name].result()]
+        if failed:
+            logger.warning(f"Skipping {test_name}: {', '.join(failed)} did not pass")
+            return None
+        
         logger.info(f"\nTesting {test_name}...")
         try:
-            result = test_func()
-            results.append((test_name, result))
+            return test_func()
         except Exception as e:
             logger.error(f"Test {test_name} failed with exception: {e}")
-            results.append((test_name, False))
+            return False
+    
+    # The checks mostly wait on the network, so run them side by side; tests only
+    # wait for their prerequisites, and one worker per test avoids deadlocks
+    with ThreadPoolExecutor(max_workers=len(tests)) as executor:
+        for test_name, test_func, prerequisites in tests:
+            futures[test_name] = executor.submit(run_test, test_name, test_func, prerequisites)
+        results = [(test_name, futures[test_name].result()) for test_name, _, _ in tests]
     
     # Summary
     logger.info("\n" + "=" * 50)
@@ -123,7 +195,7 @@ def main():
     total = len(results)
     
     for test_name, result in results:
-        status = "✓ PASS" if result else "✗ FAIL"
+        status = "- SKIP" if result is None else "✓ PASS" if result else "✗ FAIL"
         logger.info(f"{test_name}: {status}")
         if result:
             passed += 1
@@ -7,29 +7,39 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from services.stock_ai_service import stock_ai_service
+# The full LLM and database stack is imported only by the tests that use it
+from test_helpers import run_tests
+
+# Questions that should be handled by LLM
+LLM_QUESTIONS = (
+    "What is the current trend for stock 230011?",
+    "When was the last time stock 230011 changed from uptrend to downtrend?",
+    "Show me the trend history for stock 230011 over the last 7 days",
+    "How is stock 230011 trending today?",
+    "What stocks have high volume?",
+    "Show me stocks with uptrend in the last week",
+    "Show me stock names and their current trends",
+    "Which stocks have the highest price and what are their names?"
+)
+
+MULTI_TABLE_QUESTIONS = (
+    "Show me stock names and their current prices",
+    "Which stocks have uptrend and what are their names?",
+    "Show me the names of stocks with high volume",
+    "List stock names with their trend information",
+    "What are the names of stocks that changed trend recently?"
+)
 
 def test_llm_queries():
     """Test the LLM-based query processing"""
+    from services.stock_ai_service import stock_ai_service
     
     print("=== LLM-Based Query Processing Test ===\n")
     
-    # Test questions that should be handled by LLM
-    test_questions = [
-        "What is the current trend for stock 230011?",
-        "When was the last time stock 230011 changed from uptrend to downtrend?",
-        "Show me the trend history for stock 230011 over the last 7 days",
-        "How is stock 230011 trending today?",
-        "What stocks have high volume?",
-        "Show me stocks with uptrend in the last week",
-        "Show me stock names and their current trends",
-        "Which stocks have the highest price and what are their names?"
-    ]
-    
-    for i, question in enumerate(test_questions, 1):
+    results = stock_ai_service.process_questions(LLM_QUESTIONS)
+    for i, (question, result) in enumerate(zip(LLM_QUESTIONS, results), 1):
         print(f"Question {i}: {question}")
         try:
-            result = stock_ai_service.process_question(question)
             if result.status == "success":
                 print(f"   ✓ Success: {result.sql_query[:100]}...")
                 print(f"   ✓ Results: {result.row_count} rows")
@@ -42,21 +52,14 @@ def test_llm_queries():
 
 def test_multi_table_queries():
     """Test queries that specifically use multiple tables"""
+    from services.stock_ai_service import stock_ai_service
     
     print("=== Multi-Table Query Test ===\n")
     
-    multi_table_questions = [
-        "Show me stock names and their current prices",
-        "Which stocks have uptrend and what are their names?",
-        "Show me the names of stocks with high volume",
-        "List stock names with their trend information",
-        "What are the names of stocks that changed trend recently?"
-    ]
-    
-    for i, question in enumerate(multi_table_questions, 1):
+    results = stock_ai_service.process_questions(MULTI_TABLE_QUESTIONS)
+    for i, (question, result) in enumerate(zip(MULTI_TABLE_QUESTIONS, results), 1):
         print(f"Multi-table Question {i}: {question}")
         try:
-            result = stock_ai_service.process_question(question)
             if result.status == "success":
                 print(f"   ✓ SQL: {result.sql_query}")
                 print(f"   ✓ Results: {result.row_count} rows")
@@ -73,6 +76,7 @@ def test_multi_table_queries():
 
 def test_database_status():
     """Test database connection and schema"""
+    from services.stock_ai_service import stock_ai_service
     
     print("=== Database Status Test ===\n")
     
@@ -92,6 +96,7 @@ def test_database_status():
 
 def test_llm_connection():
     """Test LLM service connection"""
+    from services.stock_ai_service import stock_ai_service
     
     print("=== LLM Connection Test ===\n")
     
@@ -108,10 +113,12 @@ def test_llm_connection():
 
 if __name__ == "__main__":
     try:
-        test_database_status()
-        test_llm_connection()
-        test_llm_queries()
-        test_multi_table_queries()
+        run_tests(
+            test_database_status,
+            test_llm_connection,
+            test_llm_queries,
+            test_multi_table_queries
+        )
         print("\n=== Test completed ===")
     except Exception as e:
         print(f"Test failed with error: {e}")